@@ -1,11 +1,97 @@
+import asyncio
+import mmap
+import select
+import selectors
 import socket
 import threading
 import sys
 import os
-from datetime import datetime
+import queue
+import shutil
+import stat
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _send_msg(sock, message):
+    """Send one newline-terminated control message (str or pre-encoded bytes).
+
+    Payload and terminator go out in a single gathered sendmsg() where
+    available; any short write is finished with sendall().
+    """
+    payload = message if isinstance(message, bytes) else message.encode('utf-8')
+    if not hasattr(sock, 'sendmsg'):
+        sock.sendall(payload + b"\n")
+        return
+    sent = sock.sendmsg([payload, b"\n"])
+    if sent < len(payload) + 1:
+        sock.sendall((payload + b"\n")[sent:])
+
+
+def _recv_line(sock):
+    """Read one newline-terminated control message as raw bytes.
+
+    Bytes are peeked first so nothing past the newline is consumed; the
+    raw file body that may follow stays in the socket for recv_into.
+    """
+    data = bytearray()
+    while True:
+        peek = sock.recv(P2PClient.CONTROL_BUFFER_SIZE, socket.MSG_PEEK)
+        if not peek:
+            break
+        end = peek.find(b"\n")
+        want = end + 1 if end >= 0 else len(peek)
+        chunk = sock.recv(want)
+        data += chunk
+        if end >= 0 and len(chunk) == want:
+            break
+    return bytes(data).strip()
+
+
+def _recv_msg(sock):
+    """Read one newline-terminated control message as text"""
+    return _recv_line(sock).decode('utf-8')
+
+
+class BufferPool:
+    """Reusable receive buffers shared by concurrent downloads.
+
+    Buffers are created on demand and at most `count` are kept for reuse,
+    so steady-state downloads no longer allocate a fresh chunk each time.
+    """
+
+    def __init__(self, size, count):
+        self._size = size
+        self._q = queue.LifoQueue(maxsize=count)
+
+    def acquire(self):
+        try:
+            return self._q.get_nowait()
+        except queue.Empty:
+            return bytearray(self._size)
+
+    def release(self, buf):
+        try:
+            self._q.put_nowait(buf)
+        except queue.Full:
+            pass
+
+
+async def _write_msg(writer, message):
+    """Send one newline-terminated control message on an asyncio stream"""
+    writer.write(message.encode('utf-8') + b"\n")
+    await writer.drain()
+
 
 class P2PClient:
-    BUFFER_SIZE = 4096
+    CONTROL_BUFFER_SIZE = 4096      # protocol messages
+    TRANSFER_CHUNK = 1 << 18        # file body reads
+    SOCKET_BUFFER_SIZE = 1 << 20    # kernel SO_SNDBUF / SO_RCVBUF for peer sockets
+    SWARM_MIN_SIZE = 1 << 22        # smaller files are fetched from a single peer
+    MAX_SWARM_PEERS = 8
+    MMAP_CACHE_SIZE = 16            # open mappings kept for the non-sendfile path
+    BATCH_LIMIT = 10000             # names per PUBLISH_BULK / LOOKUP_BATCH (the server's MAX_BATCH)
     
     def __init__(self, hostname, server_host, server_port, p2p_port, shared_folder, logger=None):
         self.hostname = hostname
@@ -13,12 +99,28 @@ class P2PClient:
         self.server_port = server_port
         self.p2p_port = p2p_port
         self.shared_folder = shared_folder
+        self._shared_abs = os.path.abspath(shared_folder)
         
         self.server_socket = None
-        self.p2p_server_socket = None
         self.registered = False
+        # One request/response at a time on server_socket; threads sharing
+        # this client would otherwise read each other's replies
+        self._server_lock = threading.RLock()
         self._p2p_thread = None
+        self._p2p_loop = None
+        self._p2p_server = None
+        self._mmap_cache = OrderedDict()  # {filepath: (mmap, stat_result)}, LRU order
+        self._mmap_lock = threading.Lock()
+        self._buffers = BufferPool(self.TRANSFER_CHUNK, 2 * self.MAX_SWARM_PEERS)
         self._logger = logger  
+        self._ts_cache = (0, '')
+        # CLI commands: name -> (required args, handler, usage)
+        self._cmds = {
+            "publish": (2, self.publish_file, "publish <local_filename> <shared_filename>"),
+            "fetch": (1, self.fetch_file, "fetch <filename>"),
+            "list": (0, self.list_local_files, "list"),
+            "quit": (0, None, "quit"),
+        }
         
         # Ensure shared folder exists
         if not os.path.exists(shared_folder):
@@ -49,29 +151,51 @@ class P2PClient:
         self._p2p_thread.start()
 
     def shutdown(self):
+        self.registered = False
         try:
             if self.server_socket:
                 self.server_socket.close()
         except Exception:
             pass
         try:
-            if self.p2p_server_socket:
-                self.p2p_server_socket.close()
+            if self._p2p_loop and self._p2p_server:
+                self._p2p_loop.call_soon_threadsafe(self._p2p_server.close)
         except Exception:
             pass
+        if self._p2p_thread and self._p2p_thread is not threading.current_thread():
+            # Let the listener release its port before a new client binds it
+            self._p2p_thread.join(timeout=2)
+        with self._mmap_lock:
+            while self._mmap_cache:
+                _, (mm, _) = self._mmap_cache.popitem()
+                self._close_mmap(mm)
+    
+    def is_connected(self):
+        """True while registered and the server connection is still open (non-blocking)"""
+        sock = self.server_socket
+        if not self.registered or sock is None or sock.fileno() < 0:
+            return False
+        with self._server_lock:
+            try:
+                readable, _, _ = select.select([sock], [], [], 0)
+                # Readable with nothing pending means the server closed it
+                return not readable or sock.recv(1, socket.MSG_PEEK) != b""
+            except OSError:
+                return False
     
     def connect_to_server(self):
         try:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.connect((self.server_host, self.server_port))
+            self._enable_keepalive(self.server_socket)
             self._log(f"Connected to server at {self.server_host}:{self.server_port}")
             
             # Send registration message
             message = f"REGISTER {self.hostname} {self.p2p_port}"
-            self.server_socket.send(message.encode('utf-8'))
+            _send_msg(self.server_socket, message)
             
             # Receive response
-            response = self.server_socket.recv(self.BUFFER_SIZE).decode('utf-8')
+            response = _recv_msg(self.server_socket)
             self._log(f"Server response: {response}")
             
             if "REGISTER_SUCCESS" in response:
@@ -90,125 +214,336 @@ class P2PClient:
     
     def p2p_server(self):
         try:
-            self.p2p_server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.p2p_server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.p2p_server_socket.bind(('', self.p2p_port))
-            self.p2p_server_socket.listen(5)
-            
-            self._log(f"P2P server listening on port {self.p2p_port}")
-            
-            while True:
-                peer_socket, peer_address = self.p2p_server_socket.accept()
-                self._log(f"Peer connection from {peer_address}")
-                
-                # Handle each peer in a separate thread
-                peer_thread = threading.Thread(
-                    target=self.handle_peer_download,
-                    args=(peer_socket, peer_address),
-                    daemon=True
-                )
-                peer_thread.start()
-                
+            asyncio.run(self._p2p_serve())
         except Exception as e:
             self._log(f"P2P server error: {e}")
-    
-    def handle_peer_download(self, peer_socket, peer_address):
+
+    async def _p2p_serve(self):
+        """Serve peer downloads from a single event loop (runs on the P2P thread)"""
+        self._p2p_loop = asyncio.get_running_loop()
+        # Disk work (stat/open/mmap) runs on a small bounded pool so the
+        # event loop never blocks on the filesystem
+        self._p2p_loop.set_default_executor(ThreadPoolExecutor(
+            max_workers=min(32, (os.cpu_count() or 1) * 4), thread_name_prefix="p2p-xfer"
+        ))
+        # Buffer sizes are set once on the listener; accepted sockets inherit
+        # them, and asyncio already enables TCP_NODELAY on every transport,
+        # so accepting a peer costs no extra setsockopt calls
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SOCKET_BUFFER_SIZE)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.SOCKET_BUFFER_SIZE)
+            listener.bind(('', self.p2p_port))
+        except OSError:
+            listener.close()
+            raise
+        self._p2p_server = await asyncio.start_server(
+            self._handle_peer, sock=listener, backlog=128
+        )
+        self._log(f"P2P server listening on port {self.p2p_port}")
+        try:
+            async with self._p2p_server:
+                await self._p2p_server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+
+    def _scan_shared(self):
+        """Stat every shared file in one scandir pass: {filename: size}"""
+        sizes = {}
+        with os.scandir(self.shared_folder) as it:
+            for entry in it:
+                if entry.is_file():
+                    sizes[entry.name] = entry.stat().st_size
+        return sizes
+
+    async def _handle_peer(self, reader, writer):
+        peer_address = writer.get_extra_info('peername')
+        peer_socket = writer.get_extra_info('socket')
+        self._log(f"Peer connection from {peer_address}")
         try:
             # Receive download request
-            request = peer_socket.recv(self.BUFFER_SIZE).decode('utf-8').strip()
+            request = (await reader.readuntil(b"\n")).decode('utf-8').strip()
             self._log(f"Received from peer: {request}")
             
             if not request.startswith("DOWNLOAD"):
-                peer_socket.send("ERROR Invalid request".encode('utf-8'))
+                await _write_msg(writer, "ERROR Invalid request")
                 return
             
             # Extract filename
             parts = request.split()
             if len(parts) < 2:
-                peer_socket.send("ERROR No filename specified".encode('utf-8'))
+                await _write_msg(writer, "ERROR No filename specified")
                 return
             
             filename = parts[1]
             filepath = os.path.join(self.shared_folder, filename)
+            loop = self._p2p_loop
             
-            # Check if file exists
-            if not os.path.exists(filepath):
-                peer_socket.send("ERROR File not found".encode('utf-8'))
+            # Open first and take the size from the open fd, so the FILESIZE
+            # we announce matches what we send even if the file was rewritten
+            opened = await loop.run_in_executor(None, self._open_shared, filepath)
+            if opened is None:
+                await _write_msg(writer, "ERROR File not found")
                 self._log(f"File not found: {filename}")
                 return
+            f, st = opened
+            with f:
+                await self._send_shared(reader, writer, peer_socket, parts, filename, f, st)
             
-            # Send file size
-            filesize = os.path.getsize(filepath)
-            peer_socket.send(f"FILESIZE {filesize}".encode('utf-8'))
-            self._log(f"Sending file '{filename}' ({filesize} bytes)")
-            
-            # Wait for acknowledgment
-            ack = peer_socket.recv(self.BUFFER_SIZE).decode('utf-8').strip()
-            if ack != "BEGIN_DOWNLOAD":
-                self._log("Download cancelled by peer")
-                return
-            
-            # Send file data
-            with open(filepath, 'rb') as f:
-                sent = 0
-                while True:
-                    data = f.read(self.BUFFER_SIZE)
-                    if not data:
-                        break
-                    peer_socket.send(data)
-                    sent += len(data)
-            
-            self._log(f"File transfer complete: {sent} bytes sent")
-            
+        except asyncio.IncompleteReadError:
+            self._log("Download cancelled by peer")
         except Exception as e:
             self._log(f"Error handling peer download: {e}")
         finally:
-            peer_socket.close()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+    
+    async def _send_shared(self, reader, writer, peer_socket, parts, filename, f, st):
+        """Answer one DOWNLOAD request from an already opened file"""
+        loop = self._p2p_loop
+        filesize = st.st_size
+        # Optional byte range: DOWNLOAD <filename> <offset> <length>
+        offset, count = 0, filesize
+        if len(parts) >= 4:
+            try:
+                offset, length = int(parts[2]), int(parts[3])
+            except ValueError:
+                offset, length = -1, -1
+            if offset < 0 or length < 0 or offset > filesize:
+                await _write_msg(writer, "ERROR Invalid range")
+                return
+            count = min(length, filesize - offset)
+        
+        # Send file size (always the full size, even for a range)
+        await _write_msg(writer, f"FILESIZE {filesize}")
+        if len(parts) >= 4 and count == 0:
+            return  # size query only
+        self._log(f"Sending file '{filename}' ({count} bytes from offset {offset})")
+        
+        # Wait for acknowledgment
+        ack = (await reader.readuntil(b"\n")).decode('utf-8').strip()
+        if ack != "BEGIN_DOWNLOAD":
+            self._log("Download cancelled by peer")
+            return
+        
+        # Send file data (zero-copy via sendfile where the OS supports it,
+        # otherwise straight from a cached read-only mapping)
+        sent = 0
+        if count > 0:
+            self._set_cork(peer_socket, True)
+            try:
+                sent = await loop.sendfile(writer.transport, f, offset, count, fallback=False)
+            except asyncio.SendfileNotAvailableError:
+                mm = await loop.run_in_executor(None, self._get_mmap, f, st)
+                writer.write(memoryview(mm)[offset:offset + count])
+                await writer.drain()
+                sent = count
+            finally:
+                self._set_cork(peer_socket, False)
+
+        self._log(f"File transfer complete: {sent} bytes sent")
+    
+    @staticmethod
+    def _preallocate(f, size):
+        """Reserve the whole download up front instead of growing the file chunk by chunk"""
+        if size <= 0:
+            return
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except (AttributeError, OSError):
+            # No posix_fallocate (Windows/macOS) or unsupported by the filesystem
+            f.truncate(size)
+    
+    @staticmethod
+    def _discard_partial(filepath):
+        """Remove a preallocated download that never completed, so the
+        zero-padded tail isn't left behind (or re-published) as the file"""
+        try:
+            os.remove(filepath)
+        except OSError:
+            pass
+    
+    def _open_shared(self, filepath):
+        """Open a shared file for sending: (file, fstat result), or None if missing"""
+        try:
+            f = open(filepath, 'rb', buffering=0)
+        except OSError:
+            return None
+        st = os.fstat(f.fileno())
+        if not stat.S_ISREG(st.st_mode):
+            f.close()
+            return None
+        return f, st
+    
+    def _get_mmap(self, f, st):
+        """Return a read-only mapping of the open file f, reusing it while the file is unchanged"""
+        filepath = f.name
+        with self._mmap_lock:
+            entry = self._mmap_cache.get(filepath)
+            if entry is not None:
+                mm, cached_st = entry
+                if (cached_st.st_ino, cached_st.st_mtime_ns, cached_st.st_size) == \
+                        (st.st_ino, st.st_mtime_ns, st.st_size):
+                    self._mmap_cache.move_to_end(filepath)
+                    return mm
+                del self._mmap_cache[filepath]
+                self._close_mmap(mm)
+            
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mmap_cache[filepath] = (mm, st)
+            while len(self._mmap_cache) > self.MMAP_CACHE_SIZE:
+                _, (old, _) = self._mmap_cache.popitem(last=False)
+                self._close_mmap(old)
+            return mm
+    
+    @staticmethod
+    def _close_mmap(mm):
+        try:
+            mm.close()
+        except BufferError:
+            # Still referenced by a pending write; it is unmapped once released
+            pass
     
+    @staticmethod
+    def _enable_keepalive(sock, idle=60, interval=10, count=5):
+        """Turn on TCP keepalive so a dead server connection is noticed"""
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            for opt, value in (("TCP_KEEPIDLE", idle), ("TCP_KEEPINTVL", interval), ("TCP_KEEPCNT", count)):
+                if hasattr(socket, opt):
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opt), value)
+        except OSError:
+            pass
+
+    def _tune_peer_socket(self, sock):
+        """Size kernel buffers for bulk transfer and disable Nagle on peer sockets"""
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SOCKET_BUFFER_SIZE)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.SOCKET_BUFFER_SIZE)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _set_cork(sock, enabled):
+        """Hold back partial segments while the body is sent.
+
+        Uses TCP_CORK on Linux; elsewhere Nagle is re-enabled for the
+        duration instead (asyncio turns TCP_NODELAY on for every transport),
+        and switching NODELAY back on afterwards flushes the tail.
+        """
+        cork = getattr(socket, "TCP_CORK", None)
+        try:
+            if cork is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, cork, 1 if enabled else 0)
+            else:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 0 if enabled else 1)
+        except OSError:
+            pass
+
     def command_interface(self):
         self._log("=== P2P File Sharing Client ===")
         self._log(f"Hostname: {self.hostname}")
         self._log(f"Shared folder: {self.shared_folder}")
         self._log("Available commands: publish, fetch, list, quit")
         
+        if os.name == "nt":
+            # select() only works on sockets on Windows
+            self._blocking_command_loop()
+            return
+        
+        # One selector services both user input and the server connection,
+        # so the main thread never parks inside input()
+        sel = selectors.DefaultSelector()
+        try:
+            sel.register(sys.stdin, selectors.EVENT_READ, self._on_stdin)
+        except (ValueError, OSError):
+            sel.close()
+            self._blocking_command_loop()
+            return
+        if self.server_socket:
+            sel.register(self.server_socket, selectors.EVENT_READ, self._on_server)
+        
+        self._stdin_buf = b""
+        self._running = True
+        self._prompt()
+        with sel:
+            while self._running:
+                for key, _ in sel.select(timeout=1.0):
+                    key.data(sel)
+    
+    def _blocking_command_loop(self):
         while True:
             try:
-                command = input(f"{self.hostname}> ").strip()
-                if not command:
-                    continue
-                
-                parts = command.split()
-                cmd = parts[0].lower()
-                
-                if cmd == "publish":
-                    if len(parts) < 3:
-                        print("Usage: publish <local_filename> <shared_filename>")
-                        continue
-                    local_filename = parts[1]
-                    shared_filename = parts[2]
-                    self.publish_file(local_filename, shared_filename)
-                    
-                elif cmd == "fetch":
-                    if len(parts) < 2:
-                        print("Usage: fetch <filename>")
-                        continue
-                    filename = parts[1]
-                    self.fetch_file(filename)
-                    
-                elif cmd == "list":
-                    self.list_local_files()
-                    
-                elif cmd == "quit":
-                    self._log("Goodbye!")
-                    break
-                    
-                else:
-                    print(f"Unknown command: {cmd}")
-                    
-            except Exception as e:
-                self._log(f"Error: {e}")
+                command = input(f"{self.hostname}> ")
+            except EOFError:
+                break
+            if not self.handle_command(command):
+                break
+    
+    def _prompt(self):
+        print(f"{self.hostname}> ", end="", flush=True)
+    
+    def _on_stdin(self, sel):
+        data = os.read(sys.stdin.fileno(), self.CONTROL_BUFFER_SIZE)
+        if not data:
+            self._running = False
+            return
+        # Several commands may arrive in one read when stdin is a pipe
+        self._stdin_buf += data
+        while b"\n" in self._stdin_buf:
+            line, self._stdin_buf = self._stdin_buf.split(b"\n", 1)
+            if not self.handle_command(line.decode('utf-8', 'replace')):
+                self._running = False
+                return
+        self._prompt()
+    
+    def _on_server(self, sel):
+        # Requests are synchronous, so anything readable here was not asked for
+        message = _recv_msg(self.server_socket)
+        if not message:
+            self._log("Server closed the connection")
+            sel.unregister(self.server_socket)
+            return
+        self._log(f"Server: {message}")
+    
+    def handle_command(self, command):
+        """Run one command line; returns False when the client should exit"""
+        try:
+            command = command.strip()
+            if not command:
+                return True
+            
+            parts = command.split()
+            cmd = parts[0].lower()
+            
+            entry = self._cmds.get(cmd)
+            if entry is None:
+                print(f"Unknown command: {cmd}")
+                return True
+            
+            min_args, fn, usage = entry
+            if len(parts) - 1 < min_args:
+                print(f"Usage: {usage}")
+                return True
+            if fn is None:  # quit
+                self._log("Goodbye!")
+                return False
+            fn(*parts[1:1 + min_args])
+            
+        except Exception as e:
+            self._log(f"Error: {e}")
+        return True
     
     def publish_file(self, local_filename, shared_filename):
+        if len(shared_filename.split()) != 1:
+            # The protocol separates fields with spaces; the server rejects these
+            self._log(f"Cannot publish '{shared_filename}': filename must not contain whitespace")
+            return False
         try:
             # Check if file exists in shared folder or copy it there
             source_path = local_filename
@@ -222,17 +557,17 @@ class P2PClient:
                     return
             
             # Copy file to shared folder if not already there
-            if os.path.abspath(source_path) != os.path.abspath(dest_path):
-                import shutil
-                shutil.copy2(source_path, dest_path)
+            if os.path.abspath(source_path) != os.path.normpath(os.path.join(self._shared_abs, shared_filename)):
+                shutil.copyfile(source_path, dest_path)
                 self._log(f"Copied '{local_filename}' to shared folder as '{shared_filename}'")
             
             # Send publish message to server
             message = f"PUBLISH {shared_filename} {self.hostname}"
-            self.server_socket.send(message.encode('utf-8'))
-            
-            # Receive response
-            response = self.server_socket.recv(self.BUFFER_SIZE).decode('utf-8')
+            with self._server_lock:
+                _send_msg(self.server_socket, message)
+                
+                # Receive response
+                response = _recv_msg(self.server_socket)
             self._log(response)
             return response.startswith("PUBLISH_SUCCESS")
             
@@ -240,31 +575,66 @@ class P2PClient:
             self._log(f"Error publishing file: {e}")
             return False
     
+    def store_stream(self, stream, shared_filename):
+        """Write an open binary stream into the shared folder and return the path"""
+        dest_path = os.path.join(self.shared_folder, shared_filename)
+        if stream.seekable():
+            stream.seek(0)
+        with open(dest_path, 'wb') as f:
+            shutil.copyfileobj(stream, f, self.TRANSFER_CHUNK)
+        return dest_path
+    
     def auto_publish_files(self):
         """Automatically publish all files in the shared folder"""
         try:
-            files = os.listdir(self.shared_folder)
-            for filename in files:
-                filepath = os.path.join(self.shared_folder, filename)
-                if os.path.isfile(filepath):
-                    message = f"PUBLISH {filename} {self.hostname}"
-                    self.server_socket.send(message.encode('utf-8'))
-                    response = self.server_socket.recv(self.BUFFER_SIZE).decode('utf-8')
-                    if response.startswith("PUBLISH_SUCCESS"):
-                        self._log(f"Auto-published: {filename}")
-                    else:
-                        self._log(f"Failed to auto-publish: {filename}")
+            files = list(self._scan_shared())
+            if not files:
+                return
+            
+            published = self.publish_files(files)
+            if published:
+                self._log(f"Auto-published {published}/{len(files)} file(s): {', '.join(files)}")
         except Exception as e:
             self._log(f"Error auto-publishing files: {e}")
     
+    def publish_files(self, filenames):
+        """Publish files already in the shared folder with one PUBLISH_BULK round
+        trip per BATCH_LIMIT names.
+        
+        Returns how many files the server accepted (0 on failure).
+        """
+        skipped = [f for f in filenames if len(f.split()) != 1]
+        if skipped:
+            # The protocol separates fields with spaces; the server rejects these
+            self._log(f"Not publishing {len(skipped)} file(s) with whitespace in the name: {', '.join(skipped)}")
+            filenames = [f for f in filenames if len(f.split()) == 1]
+        if not filenames:
+            return 0
+        published = 0
+        try:
+            for i in range(0, len(filenames), self.BATCH_LIMIT):
+                chunk = filenames[i:i + self.BATCH_LIMIT]
+                message = "\n".join([f"PUBLISH_BULK {self.hostname} {len(chunk)}", *chunk])
+                with self._server_lock:
+                    _send_msg(self.server_socket, message)
+                    response = _recv_msg(self.server_socket)
+                if not response.startswith("PUBLISH_BULK_OK"):
+                    self._log(f"Failed to publish: {response}")
+                    break
+                published += int(response.split()[1])
+        except Exception as e:
+            self._log(f"Error publishing files: {e}")
+        return published
+    
     def fetch_file(self, filename):
         try:
             # Send fetch request to server
             message = f"FETCH {filename}"
-            self.server_socket.send(message.encode('utf-8'))
-            
-            # Receive response
-            response = self.server_socket.recv(self.BUFFER_SIZE).decode('utf-8').strip()
+            with self._server_lock:
+                _send_msg(self.server_socket, message)
+                
+                # Receive response
+                response = _recv_msg(self.server_socket)
             self._log(response)
             
             if response.startswith("FETCH_NOT_FOUND"):
@@ -281,19 +651,21 @@ class P2PClient:
                 self._log("No peers available")
                 return
             
-            peers = parts[1:]  # List of "ip:port:hostname"
+            peers = []  # List of (ip, port, hostname)
+            for peer_info in parts[1:]:
+                peer_parts = peer_info.split(':')
+                if len(peer_parts) >= 3:
+                    peers.append((peer_parts[0], int(peer_parts[1]), peer_parts[2]))
             self._log(f"Found {len(peers)} peer(s) with the file")
             
+            # Split the file across every other seeder when there is more than one
+            swarm_peers = [p for p in peers if p[2] != self.hostname]
+            if len(swarm_peers) > 1 and self.swarm_download(swarm_peers, filename):
+                self._log(f"Successfully downloaded '{filename}'")
+                return
+            
             # Try to download from first available peer
-            for peer_info in peers:
-                peer_parts = peer_info.split(':')
-                if len(peer_parts) < 3:
-                    continue
-                
-                peer_ip = peer_parts[0]
-                peer_port = int(peer_parts[1])
-                peer_hostname = peer_parts[2]
-                
+            for peer_ip, peer_port, peer_hostname in peers:
                 self._log(f"Attempting download from {peer_hostname} ({peer_ip}:{peer_port})")
                 
                 if self.download_from_peer(peer_ip, peer_port, filename):
@@ -309,17 +681,21 @@ class P2PClient:
     
     def download_from_peer(self, peer_ip, peer_port, filename):
         peer_socket = None
+        buf = None
+        filepath = None
+        complete = False
         try:
             # Connect to peer
             peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._tune_peer_socket(peer_socket)
             peer_socket.connect((peer_ip, peer_port))
             
             # Send download request
             message = f"DOWNLOAD {filename}"
-            peer_socket.send(message.encode('utf-8'))
+            _send_msg(peer_socket, message)
             
             # Receive file size
-            response = peer_socket.recv(self.BUFFER_SIZE).decode('utf-8').strip()
+            response = _recv_msg(peer_socket)
             
             if response.startswith("ERROR"):
                 self._log(f"Peer error: {response}")
@@ -333,22 +709,26 @@ class P2PClient:
             self._log(f"File size: {filesize} bytes")
             
             # Send acknowledgment
-            peer_socket.send("BEGIN_DOWNLOAD".encode('utf-8'))
+            _send_msg(peer_socket, "BEGIN_DOWNLOAD")
             
             # Receive file data
             filepath = os.path.join(self.shared_folder, filename)
             received = 0
+            buf = self._buffers.acquire()
+            mv = memoryview(buf)
             
             with open(filepath, 'wb') as f:
+                self._preallocate(f, filesize)
                 while received < filesize:
-                    data = peer_socket.recv(self.BUFFER_SIZE)
-                    if not data:
+                    n = peer_socket.recv_into(mv, min(len(mv), filesize - received))
+                    if n == 0:
                         break
-                    f.write(data)
-                    received += len(data)
+                    f.write(mv[:n])
+                    received += n
             
             if received == filesize:
                 self._log(f"Download complete: {received} bytes")
+                complete = True
                 return True
             else:
                 self._log(f"Download incomplete: {received}/{filesize} bytes")
@@ -357,33 +737,161 @@ class P2PClient:
         except Exception as e:
             self._log(f"Error downloading from peer: {e}")
             return False
+        finally:
+            if buf is not None:
+                self._buffers.release(buf)
+            if peer_socket:
+                peer_socket.close()
+            if filepath is not None and not complete:
+                self._discard_partial(filepath)
+
+    def swarm_download(self, peers, filename):
+        """Download disjoint byte ranges of a file from several peers in parallel"""
+        filesize = None
+        for peer_ip, peer_port, _ in peers:
+            filesize = self.query_filesize(peer_ip, peer_port, filename)
+            if filesize is not None:
+                break
+        if filesize is None or filesize < self.SWARM_MIN_SIZE:
+            return False
+        
+        peers = peers[:self.MAX_SWARM_PEERS]
+        self._log(f"File size: {filesize} bytes")
+        self._log(f"Downloading '{filename}' from {len(peers)} peers in parallel")
+        
+        # Preallocate so every range can be written in place
+        filepath = os.path.join(self.shared_folder, filename)
+        with open(filepath, 'wb') as f:
+            self._preallocate(f, filesize)
+        
+        step = -(-filesize // len(peers))
+        ranges = [(peer, offset, min(step, filesize - offset))
+                  for peer, offset in zip(peers, range(0, filesize, step))]
+        results = [False] * len(ranges)
+        
+        def worker(i, peer, offset, length):
+            results[i] = self.download_range(peer[0], peer[1], filename, offset, length)
+        
+        threads = [threading.Thread(target=worker, args=(i, *r), daemon=True)
+                   for i, r in enumerate(ranges)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        if all(results):
+            self._log(f"Download complete: {filesize} bytes")
+            return True
+        self._discard_partial(filepath)
+        self._log("Parallel download incomplete, falling back to a single peer")
+        return False
+    
+    def query_filesize(self, peer_ip, peer_port, filename):
+        """Ask a peer for a file's size without transferring it (zero-length range)"""
+        peer_socket = None
+        try:
+            peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            peer_socket.connect((peer_ip, peer_port))
+            _send_msg(peer_socket, f"DOWNLOAD {filename} 0 0")
+            response = _recv_msg(peer_socket)
+            if not response.startswith("FILESIZE"):
+                return None
+            return int(response.split()[1])
+        except Exception as e:
+            self._log(f"Error querying peer: {e}")
+            return None
         finally:
             if peer_socket:
                 peer_socket.close()
+    
+    def download_range(self, peer_ip, peer_port, filename, offset, length):
+        """Fetch bytes [offset, offset+length) of a file into the preallocated local copy"""
+        peer_socket = None
+        buf = None
+        try:
+            peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._tune_peer_socket(peer_socket)
+            peer_socket.connect((peer_ip, peer_port))
+            _send_msg(peer_socket, f"DOWNLOAD {filename} {offset} {length}")
+            response = _recv_msg(peer_socket)
+            if not response.startswith("FILESIZE"):
+                self._log(f"Peer error: {response}")
+                return False
+            _send_msg(peer_socket, "BEGIN_DOWNLOAD")
+            
+            filepath = os.path.join(self.shared_folder, filename)
+            received = 0
+            buf = self._buffers.acquire()
+            mv = memoryview(buf)
+            with open(filepath, 'r+b') as f:
+                f.seek(offset)
+                while received < length:
+                    n = peer_socket.recv_into(mv, min(len(mv), length - received))
+                    if n == 0:
+                        break
+                    f.write(mv[:n])
+                    received += n
+            return received == length
+        except Exception as e:
+            self._log(f"Error downloading range from peer: {e}")
+            return False
+        finally:
+            if buf is not None:
+                self._buffers.release(buf)
+            if peer_socket:
+                peer_socket.close()
 
     def fetch_peers(self, filename):
         try:
             message = f"FETCH {filename}"
-            self.server_socket.send(message.encode('utf-8'))
-            response = self.server_socket.recv(self.BUFFER_SIZE).decode('utf-8').strip()
-            if not response.startswith("FETCH_OK"):
+            with self._server_lock:
+                _send_msg(self.server_socket, message)
+                raw = _recv_line(self.server_socket)
+            if not raw.startswith(b"FETCH_OK"):
                 return []
-            parts = response.split()
-            peers = []
-            for p in parts[1:]:
-                s = p.split(":")
-                if len(s) >= 3:
-                    peers.append({"ip": s[0], "port": int(s[1]), "hostname": s[2]})
-            return peers
+            return self._parse_peers(raw.split()[1:])
         except Exception:
             return []
     
+    def fetch_peers_batch(self, filenames):
+        """Look up peers for many files, one round trip per BATCH_LIMIT names:
+        {filename: [peers]}"""
+        results = {}
+        try:
+            for i in range(0, len(filenames), self.BATCH_LIMIT):
+                chunk = filenames[i:i + self.BATCH_LIMIT]
+                message = "\n".join([f"LOOKUP_BATCH {len(chunk)}", *chunk])
+                with self._server_lock:
+                    _send_msg(self.server_socket, message)
+                    header = _recv_line(self.server_socket).split()
+                    if not header or header[0] != b"LOOKUP_BATCH_OK":
+                        break
+                    # One peer-list line per requested name, in request order, so
+                    # names containing spaces need no parsing
+                    for filename in chunk[:int(header[1])]:
+                        results[filename] = self._parse_peers(_recv_line(self.server_socket).split())
+            return results
+        except Exception as e:
+            self._log(f"Error looking up peers: {e}")
+            return {}
+    
+    @staticmethod
+    def _parse_peers(tokens):
+        # Parse ip:port:hostname tokens as bytes; only the leaf fields get decoded
+        peers = []
+        for p in tokens:
+            s = p.split(b":")
+            if len(s) >= 3:
+                peers.append({"ip": s[0].decode(), "port": int(s[1]), "hostname": s[2].decode('utf-8')})
+        return peers
+    
     def get_client_list(self):
         """Get list of all active clients from server"""
         try:
             message = "LIST_CLIENTS"
-            self.server_socket.send(message.encode('utf-8'))
-            response = self.server_socket.recv(self.BUFFER_SIZE).decode('utf-8').strip()
+            with self._server_lock:
+                _send_msg(self.server_socket, message)
+                response = _recv_msg(self.server_socket)
             if not response.startswith("LIST_CLIENTS_OK"):
                 return []
             parts = response.split()
@@ -397,72 +905,89 @@ class P2PClient:
         """Get list of files shared by a specific client"""
         try:
             message = f"DISCOVER_CLIENT {client_hostname}"
-            self.server_socket.send(message.encode('utf-8'))
-            response = self.server_socket.recv(self.BUFFER_SIZE).decode('utf-8').strip()
-            if response.startswith("DISCOVER_CLIENT_NOT_FOUND"):
+            with self._server_lock:
+                _send_msg(self.server_socket, message)
+                raw = _recv_line(self.server_socket)
+            if raw.startswith(b"DISCOVER_CLIENT_NOT_FOUND"):
                 return None
-            if not response.startswith("DISCOVER_CLIENT_OK"):
+            if not raw.startswith(b"DISCOVER_CLIENT_OK"):
                 return []
-            parts = response.split()
             # parts[0] is "DISCOVER_CLIENT_OK", rest are filenames
-            return parts[1:] if len(parts) > 1 else []
+            return [name.decode('utf-8') for name in raw.split()[1:]]
         except Exception as e:
             self._log(f"Error getting client files: {e}")
             return []
 
     def download_from_peer_with_progress(self, peer_ip, peer_port, filename, progress_cb=None):
         peer_socket = None
+        buf = None
+        filepath = None
+        complete = False
         try:
             peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._tune_peer_socket(peer_socket)
             peer_socket.connect((peer_ip, peer_port))
-            peer_socket.send(f"DOWNLOAD {filename}".encode("utf-8"))
-            response = peer_socket.recv(self.BUFFER_SIZE).decode("utf-8").strip()
+            _send_msg(peer_socket, f"DOWNLOAD {filename}")
+            response = _recv_msg(peer_socket)
             if not response.startswith("FILESIZE"):
                 return False
             filesize = int(response.split()[1])
-            peer_socket.send("BEGIN_DOWNLOAD".encode("utf-8"))
+            _send_msg(peer_socket, "BEGIN_DOWNLOAD")
             filepath = os.path.join(self.shared_folder, filename)
             received = 0
+            buf = self._buffers.acquire()
+            mv = memoryview(buf)
             with open(filepath, "wb") as f:
+                self._preallocate(f, filesize)
                 while received < filesize:
-                    chunk = peer_socket.recv(self.BUFFER_SIZE)
-                    if not chunk:
+                    n = peer_socket.recv_into(mv, min(len(mv), filesize - received))
+                    if n == 0:
                         break
-                    f.write(chunk)
-                    received += len(chunk)
+                    f.write(mv[:n])
+                    received += n
                     if progress_cb:
                         try:
                             progress_cb(received, filesize)
                         except Exception:
                             pass
-            return received == filesize
+            complete = received == filesize
+            return complete
         except Exception as e:
             self._log(f"Error downloading from peer: {e}")
             return False
         finally:
+            if buf is not None:
+                self._buffers.release(buf)
             try:
                 if peer_socket:
                     peer_socket.close()
             except Exception:
                 pass
+            if filepath is not None and not complete:
+                self._discard_partial(filepath)
     
     def list_local_files(self):
         try:
-            files = os.listdir(self.shared_folder)
+            entries = sorted(self._scan_shared().items())
             self._log("Files in shared folder:")
-            if not files:
+            if not entries:
                 self._log("  (empty)")
             else:
-                for f in files:
-                    filepath = os.path.join(self.shared_folder, f)
-                    if os.path.isfile(filepath):
-                        size = os.path.getsize(filepath)
-                        self._log(f"  - {f} ({size} bytes)")
+                for name, size in entries:
+                    self._log(f"  - {name} ({size} bytes)")
         except Exception as e:
             self._log(f"Error listing files: {e}")
     
     def get_timestamp(self):
-        return datetime.now().strftime("%H:%M:%S")
+        # Reformat at most once per second; log bursts reuse the cached string
+        now = int(time.time())
+        cached = self._ts_cache
+        if cached[0] == now:
+            return cached[1]
+        lt = time.localtime(now)
+        stamp = f"{lt.tm_hour:02d}:{lt.tm_min:02d}:{lt.tm_sec:02d}"
+        self._ts_cache = (now, stamp)
+        return stamp
 
     def _log(self, msg: str):
         if self._logger:
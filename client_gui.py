@@ -1,6 +1,9 @@
 import os
-import threading
+import re
+import time
 import tkinter as tk
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, filedialog, simpledialog, messagebox
 
 # Try to import tkinterdnd2 for drag-and-drop support
@@ -13,21 +16,48 @@ except ImportError:
 
 from client import P2PClient
 
+# Search result rows look like "[1] hostname (ip:port)"
+_PEER_RE = re.compile(r'^(?:\[\d+\]\s*)?(.+?) \((.+):(\d+)\)\s*$')
+
+def _sync_listbox(listbox: tk.Listbox, var: tk.StringVar, items):
+    """Show items in a listbox bound to var with one Tcl variable write.
+
+    Skipped entirely when the rows are already what we would set.
+    """
+    items = tuple(items)
+    if listbox.get(0, tk.END) != items:
+        var.set(items)
+
 class TextLogger:
     def __init__(self, text_widget: tk.Text):
         self.text = text_widget
         self.text.configure(state=tk.DISABLED)
+        self._q = deque(maxlen=5000)  # lines waiting for the next drain
+        self._drain_scheduled = False
 
     def __call__(self, line: str):
-        self.text.after(0, self._append, line)
-
-    def _append(self, line: str):
+        # Called from worker threads too; a burst of lines becomes one widget update
+        self._q.append(line)
+        if not self._drain_scheduled:
+            self._drain_scheduled = True
+            self.text.after(50, self._drain)
+
+    def _drain(self):
+        # Clear the flag first so lines logged while draining schedule a new pass
+        self._drain_scheduled = False
+        items = []
+        while self._q:
+            items.append(self._q.popleft())
+        if not items:
+            return
         self.text.configure(state=tk.NORMAL)
-        self.text.insert(tk.END, line + "\n")
+        self.text.insert(tk.END, "\n".join(items) + "\n")
         self.text.see(tk.END)
         self.text.configure(state=tk.DISABLED)
 
 class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
+    CACHE_TTL = 30.0  # seconds a server lookup is reused before asking again
+
     def __init__(self):
         super().__init__()
         self.title("P2P File Sharing Client")
@@ -35,6 +65,16 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
 
         self.client: P2PClient | None = None
         self.file_owners_cache = {}  # Cache to store which clients have which files
+        self._cache = {}  # {(call, arg): (timestamp, value)} for server lookups
+        self._shared_cache = (0, [])  # (folder st_mtime_ns, sorted filenames)
+        self._progress_value = 0.0
+        self._progress_pending = False
+        # Background jobs for button handlers share a few reused threads;
+        # downloads get their own so long transfers can't starve the short
+        # server calls behind them
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="p2p-gui")
+        self._dl_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="p2p-gui-dl")
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
 
         self._build_connection_panel()
         self._build_main_area()
@@ -47,6 +87,13 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
             self._setup_drag_drop()
             self.logger("Drag-and-drop enabled: Drop files onto 'My Shared Files' area to publish")
 
+    def _on_close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._dl_pool.shutdown(wait=False, cancel_futures=True)
+        if self.client:
+            self.client.shutdown()
+        self.destroy()
+
     def _build_connection_panel(self):
         frame = ttk.Frame(self)
         frame.pack(fill=tk.X, padx=8, pady=6)
@@ -93,7 +140,8 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
         self.shared_list_frame = ttk.Frame(left)
         self.shared_list_frame.pack(fill=tk.BOTH, expand=True)
         
-        self.shared_list = tk.Listbox(self.shared_list_frame, height=20)
+        self.shared_list_var = tk.StringVar()
+        self.shared_list = tk.Listbox(self.shared_list_frame, height=20, listvariable=self.shared_list_var)
         self.shared_list.pack(fill=tk.BOTH, expand=True)
         self.shared_list.bind('<Button-3>', self._on_shared_file_right_click)  # Right-click for context menu
         
@@ -108,12 +156,14 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
         ttk.Label(client_header, text="Connected Clients:").pack(side=tk.LEFT)
         ttk.Button(client_header, text="Refresh", command=self._on_get_clients).pack(side=tk.RIGHT, padx=4)
         
-        self.client_list = tk.Listbox(middle, height=10)
+        self.client_list_var = tk.StringVar()
+        self.client_list = tk.Listbox(middle, height=10, listvariable=self.client_list_var)
         self.client_list.pack(fill=tk.BOTH, expand=True, pady=4)
         self.client_list.bind('<<ListboxSelect>>', self._on_client_selected)
         
         ttk.Label(middle, text="Client's Files:").pack(anchor=tk.W, pady=(8,0))
-        self.client_files_list = tk.Listbox(middle, height=10)
+        self.client_files_var = tk.StringVar()
+        self.client_files_list = tk.Listbox(middle, height=10, listvariable=self.client_files_var)
         self.client_files_list.pack(fill=tk.BOTH, expand=True)
         self.client_files_list.bind('<Double-Button-1>', self._on_client_file_double_click)
 
@@ -128,7 +178,8 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
         ttk.Button(top_row, text="Fetch", command=self._on_fetch).pack(side=tk.LEFT)
 
         ttk.Label(right, text="Search Results (Peers with file):").pack(anchor=tk.W, pady=(8,0))
-        self.results_list = tk.Listbox(right, height=14)
+        self.results_var = tk.StringVar()
+        self.results_list = tk.Listbox(right, height=14, listvariable=self.results_var)
         self.results_list.pack(fill=tk.BOTH, expand=True)
 
         ttk.Button(right, text="Download from Selected Peer", command=self._on_download).pack(anchor=tk.W, pady=6)
@@ -157,21 +208,32 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
             return
 
         shared_folder = os.path.join(os.getcwd(), "shared_files", hostname)
-        os.makedirs(shared_folder, exist_ok=True)
-
-        self.client = P2PClient(
-            hostname=hostname,
-            server_host=server_ip,
-            server_port=server_port,
-            p2p_port=p2p_port,
-            shared_folder=shared_folder,
-            logger=self.logger,
-        )
 
         def _connect_job():
-            ok = self.client.connect_and_start()
-            self.log_text.after(0, lambda: self._set_connected(ok))
-        threading.Thread(target=_connect_job, daemon=True).start()
+            # Folder creation may block on slow or network storage, so it
+            # happens here rather than on the UI thread
+            try:
+                os.makedirs(shared_folder, exist_ok=True)
+            except OSError as e:
+                self.logger(f"Error creating shared folder: {e}")
+                self.log_text.after(0, self._set_connected, False)
+                return
+            client = P2PClient(
+                hostname=hostname,
+                server_host=server_ip,
+                server_port=server_port,
+                p2p_port=p2p_port,
+                shared_folder=shared_folder,
+                logger=self.logger,
+            )
+            ok = client.connect_and_start()
+            # Publish the client from the UI thread so handlers never see it half set up
+            self.log_text.after(0, self._on_connected, client, ok)
+        self._pool.submit(_connect_job)
+
+    def _on_connected(self, client, ok):
+        self.client = client
+        self._set_connected(ok)
 
     def _on_publish(self):
         if not self.client or not self.client.registered:
@@ -188,8 +250,28 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
         def _pub_job():
             ok = self.client.publish_file(lname, fname)
             if ok:
+                self._invalidate(fname)
                 self._refresh_shared_list()
-        threading.Thread(target=_pub_job, daemon=True).start()
+        self._pool.submit(_pub_job)
+
+    def _cached(self, key, fn, *args):
+        """Return a recent result for key, or call fn(*args) and remember it"""
+        hit = self._cache.get(key)
+        if hit is not None and time.monotonic() - hit[0] < self.CACHE_TTL:
+            return hit[1]
+        value = fn(*args)
+        if value:  # don't pin errors or empty answers
+            self._cache[key] = (time.monotonic(), value)
+        return value
+
+    def _invalidate(self, fname=None):
+        """Drop cached lookups that a publish or download of fname made stale"""
+        self._shared_cache = (0, [])
+        self._cache.pop(("clients", None), None)
+        if self.client:
+            self._cache.pop(("files", self.client.hostname), None)
+        if fname:
+            self._cache.pop(("peers", fname), None)
 
     def _on_fetch(self):
         if not self.client or not self.client.registered:
@@ -201,9 +283,9 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
             return
 
         def _fetch_job():
-            peers = self.client.fetch_peers(fname)
+            peers = self._cached(("peers", fname), self.client.fetch_peers, fname)
             self.results_list.after(0, self._fill_results, peers)
-        threading.Thread(target=_fetch_job, daemon=True).start()
+        self._pool.submit(_fetch_job)
 
     def _on_download(self):
         if not self.client or not self.client.registered:
@@ -219,40 +301,41 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
             return
         idx = sel[0]
         line = self.results_list.get(idx)
-        try:
-            # Parse format: "[1] hostname (ip:port)"
-            if line.startswith('['):
-                # Remove the number prefix
-                line = line.split(']', 1)[1].strip()
-            
-            host_part = line.split(" (")[0].strip()
-            addr_part = line.split("(")[-1].rstrip(")").strip()
-            ip, port_s = addr_part.split(":")
-            port = int(port_s)
-        except Exception:
+        m = _PEER_RE.match(line)
+        if not m:
             messagebox.showerror("Parse Error", "Could not parse selected peer address")
             return
+        host_part, ip, port = m.group(1), m.group(2), int(m.group(3))
 
         self.progress.configure(value=0, maximum=100)
-
-        def progress_cb(done, total):
-            pct = 0 if total <= 0 else (done / total) * 100.0
-            self.progress.after(0, lambda: self.progress.configure(value=pct))
+        self._progress_value = 0.0
 
         def _dl_job():
-            ok = self.client.download_from_peer_with_progress(ip, port, fname, progress_cb)
+            ok = self.client.download_from_peer_with_progress(ip, port, fname, self._on_progress)
             if ok:
                 self.logger(f"Downloaded '{fname}' to {self.client.shared_folder}")
                 try:
                     self.client.publish_file(os.path.join(self.client.shared_folder, fname), fname)
                 except Exception:
                     pass
+                self._invalidate(fname)
                 self._refresh_shared_list()
                 # Update the file owners cache
                 self._refresh_file_owners_cache()
             else:
                 self.logger(f"Failed to download '{fname}' from {host_part}")
-        threading.Thread(target=_dl_job, daemon=True).start()
+        self._dl_pool.submit(_dl_job)
+    
+    def _on_progress(self, done, total):
+        # Only the latest value matters; post at most one redraw per ~33 ms
+        self._progress_value = 0 if total <= 0 else (done / total) * 100.0
+        if not self._progress_pending:
+            self._progress_pending = True
+            self.progress.after(33, self._flush_progress)
+
+    def _flush_progress(self):
+        self._progress_pending = False
+        self.progress.configure(value=self._progress_value)
     
     def _on_get_clients(self):
         """Get list of all connected clients from server"""
@@ -261,9 +344,9 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
             return
         
         def _get_clients_job():
-            clients = self.client.get_client_list()
+            clients = self._cached(("clients", None), self.client.get_client_list)
             self.client_list.after(0, self._fill_client_list, clients)
-        threading.Thread(target=_get_clients_job, daemon=True).start()
+        self._pool.submit(_get_clients_job)
     
     def _on_client_selected(self, event):
         """Handle client selection from the list"""
@@ -278,9 +361,9 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
         client_hostname = self.client_list.get(idx)
         
         def _get_files_job():
-            files = self.client.get_client_files(client_hostname)
+            files = self._cached(("files", client_hostname), self.client.get_client_files, client_hostname)
             self.client_files_list.after(0, self._fill_client_files, files, client_hostname)
-        threading.Thread(target=_get_files_job, daemon=True).start()
+        self._pool.submit(_get_files_job)
     
     def _on_client_file_double_click(self, event):
         """Handle double-click on a file in client's file list"""
@@ -332,8 +415,9 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
                 def _pub_job(fpath=filepath, fname=filename):
                     ok = self.client.publish_file(fpath, fname)
                     if ok:
+                        self._invalidate(fname)
                         self._refresh_shared_list()
-                threading.Thread(target=_pub_job, daemon=True).start()
+                self._pool.submit(_pub_job)
             else:
                 self.logger(f"Skipping non-file: {filepath}")
     
@@ -406,24 +490,29 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
     def _refresh_shared_list(self):
         if not self.client:
             return
-        self.shared_list.delete(0, tk.END)
+        items = []
         try:
-            for item in sorted(os.listdir(self.client.shared_folder)):
-                p = os.path.join(self.client.shared_folder, item)
-                if os.path.isfile(p):
-                    # Check if we have cached info about who has this file
-                    if item in self.file_owners_cache:
-                        owners = self.file_owners_cache[item]
-                        if len(owners) > 1:
-                            # Multiple clients have this file
-                            display_text = f"{item} [{len(owners)} clients]"
-                        else:
-                            display_text = item
-                    else:
-                        display_text = item
-                    self.shared_list.insert(tk.END, display_text)
+            # The folder's mtime only moves when entries are added, removed or
+            # renamed, so an unchanged folder costs a single stat
+            folder_mtime = os.stat(self.client.shared_folder).st_mtime_ns
+            if folder_mtime == self._shared_cache[0]:
+                names = self._shared_cache[1]
+            else:
+                # DirEntry carries the file type, so no extra stat per entry
+                with os.scandir(self.client.shared_folder) as it:
+                    names = sorted((e.name for e in it if e.is_file()), key=str.lower)
+                self._shared_cache = (folder_mtime, names)
+            for item in names:
+                # Check if we have cached info about who has this file
+                owners = self.file_owners_cache.get(item)
+                if owners and len(owners) > 1:
+                    # Multiple clients have this file
+                    items.append(f"{item} [{len(owners)} clients]")
+                else:
+                    items.append(item)
         except Exception:
             pass
+        _sync_listbox(self.shared_list, self.shared_list_var, items)
     
     def _refresh_file_owners_cache(self):
         """Refresh the cache of which clients have which files"""
@@ -432,22 +521,21 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
         
         def _refresh_job():
             try:
-                for item in os.listdir(self.client.shared_folder):
-                    p = os.path.join(self.client.shared_folder, item)
-                    if os.path.isfile(p):
-                        peers = self.client.fetch_peers(item)
-                        if peers:
-                            self.file_owners_cache[item] = [p['hostname'] for p in peers]
+                with os.scandir(self.client.shared_folder) as it:
+                    names = [e.name for e in it if e.is_file()]
+                for item in names:
+                    peers = self.client.fetch_peers(item)
+                    if peers:
+                        self.file_owners_cache[item] = [p['hostname'] for p in peers]
                 self.shared_list.after(0, self._refresh_shared_list)
             except Exception as e:
                 self.logger(f"Error refreshing file owners: {e}")
         
-        threading.Thread(target=_refresh_job, daemon=True).start()
+        self._pool.submit(_refresh_job)
 
     def _fill_results(self, peers):
-        self.results_list.delete(0, tk.END)
         if not peers:
-            self.results_list.insert(tk.END, "(no peers found)")
+            _sync_listbox(self.results_list, self.results_var, ["(no peers found)"])
             return
         
         # Update cache with this information
@@ -456,32 +544,26 @@ class ClientGUI(TkinterDnD.Tk if HAS_DND else tk.Tk):
             self.file_owners_cache[fname] = [p['hostname'] for p in peers]
         
         # Display peers with better formatting
-        for i, p in enumerate(peers, 1):
-            self.results_list.insert(tk.END, f"[{i}] {p['hostname']} ({p['ip']}:{p['port']})")
+        lines = [f"[{i}] {p['hostname']} ({p['ip']}:{p['port']})" for i, p in enumerate(peers, 1)]
+        _sync_listbox(self.results_list, self.results_var, lines)
     
     def _fill_client_list(self, clients):
         """Fill the client list with active clients"""
-        self.client_list.delete(0, tk.END)
-        self.client_files_list.delete(0, tk.END)
+        self.client_files_var.set(())
         if not clients:
-            self.client_list.insert(tk.END, "(no clients found)")
+            _sync_listbox(self.client_list, self.client_list_var, ["(no clients found)"])
             return
-        for client_hostname in clients:
-            # Don't show our own hostname
-            if self.client and client_hostname != self.client.hostname:
-                self.client_list.insert(tk.END, client_hostname)
+        # Don't show our own hostname
+        own = self.client.hostname if self.client else None
+        _sync_listbox(self.client_list, self.client_list_var, [h for h in clients if self.client and h != own])
     
     def _fill_client_files(self, files, client_hostname):
         """Fill the client files list with files from selected client"""
-        self.client_files_list.delete(0, tk.END)
         if files is None:
-            self.client_files_list.insert(tk.END, f"(client '{client_hostname}' not found)")
-            return
-        if not files:
-            self.client_files_list.insert(tk.END, "(no files shared)")
-            return
-        for filename in files:
-            self.client_files_list.insert(tk.END, filename)
+            files = [f"(client '{client_hostname}' not found)"]
+        elif not files:
+            files = ["(no files shared)"]
+        _sync_listbox(self.client_files_list, self.client_files_var, files)
 
 
 if __name__ == "__main__":
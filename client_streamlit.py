@@ -1,8 +1,14 @@
 import streamlit as st
+import html
 import os
 import threading
 import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from itertools import islice
+from streamlit.runtime.scriptrunner import add_script_run_ctx
 from client import P2PClient
 
 # Page configuration
@@ -13,8 +19,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better styling
-st.markdown("""
+# Custom CSS for better styling. Kept as one constant and emitted once per
+# run: Streamlit drops any element a rerun does not re-emit, so the block
+# can't be sent only once per session without losing the styling.
+APP_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -71,25 +79,207 @@ st.markdown("""
         width: 100%;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 # Initialize session state
 if 'client' not in st.session_state:
     st.session_state.client = None
+    st.session_state.client_entry = None  # shared get_client() entry this session holds
     st.session_state.connected = False
-    st.session_state.logs = []
-    st.session_state.file_owners_cache = {}
+    st.session_state.logs = deque(maxlen=100)  # oldest entries fall off the left
+    st.session_state.file_owners_cache = {}  # {filename: set of hostnames}
     st.session_state.selected_client = None
     st.session_state.client_files = []
     st.session_state.search_results = []
     st.session_state.last_refresh = None
+    st.session_state.clients_token = 0  # bumped to force fresh server lookups
+    st.session_state.clients = []  # client list, only fetched on connect and Refresh
+    st.session_state.availability_fp = None  # fingerprint of the last availability check
+    st.session_state.downloads = {}  # {(filename, peer hostname): progress state}
+    st.session_state.download_notices = []
 
 # Logger function
+# Log entries are (time, level, message); the level is worked out once here
+# so the Activity tab only has to lay the rows out
+def _log_level(message):
+    if "✅" in message or "Successfully" in message:
+        return "✅ success"
+    if "❌" in message or "Failed" in message or "Error" in message:
+        return "❌ error"
+    if "⚠️" in message or "Warning" in message:
+        return "⚠️ warning"
+    return "ℹ️ info"
+
 def add_log(message):
     timestamp = datetime.now().strftime("%H:%M:%S")
-    st.session_state.logs.append(f"[{timestamp}] {message}")
-    if len(st.session_state.logs) > 100:
-        st.session_state.logs.pop(0)
+    st.session_state.logs.append((timestamp, _log_level(message), message))
+
+# Human-readable sizes: bisect on the unit boundaries picks (divisor, format)
+_SIZE_LIMITS = (1024, 1024 * 1024)
+_SIZE_UNITS = ((1, "{:,} bytes"), (1024, "{:.1f} KB"), (1024 * 1024, "{:.1f} MB"))
+
+def format_size(size):
+    div, fmt = _SIZE_UNITS[bisect_right(_SIZE_LIMITS, size)]
+    return fmt.format(size / div if div > 1 else size)
+
+# My Files cards, filled with format_map and sent as one markdown block.
+# The owner list is a <details> inside the card so each card stays one piece.
+FILE_CARD_TMPL = ('<div class="file-card"><strong>📄 {name}</strong> {badge}<br>'
+                  '<small>Size: {size}</small>{owners}</div>')
+OWNERS_TMPL = "<details><summary>View clients with '{name}'</summary>{items}</details>"
+BADGE_TMPL = '<span class="info-badge">{count} clients</span>'
+
+# Seconds a "Check File Availability" answer counts as fresh
+AVAILABILITY_TTL = 30
+
+# Shared folder listing, reused across reruns until the folder changes.
+# Callers pass the folder's mtime so adding/removing files busts the cache;
+# the short TTL covers files rewritten in place.
+@st.cache_data(ttl=5, show_spinner=False)
+def list_shared(folder, mtime_ns):
+    # DirEntry.is_file() comes from the readdir buffer; stat() is the only
+    # per-file syscall left (and none at all on Windows)
+    rows = []
+    with os.scandir(folder) as it:
+        for e in sorted((e for e in it if e.is_file()), key=lambda e: e.name):
+            size = e.stat().st_size
+            rows.append((e.name, size, format_size(size)))
+    return rows
+
+# Server lookups, reused for a few seconds so reruns don't each cost a round
+# trip. `who` identifies the tracker and our hostname; bumping `token`
+# (st.session_state.clients_token) forces a fresh answer.
+@st.cache_data(ttl=10, show_spinner=False)
+def cached_client_files(_client, who, client_hostname, token):
+    return _client.get_client_files(client_hostname)
+
+@st.cache_data(ttl=10, show_spinner=False)
+def cached_fetch_peers(_client, who, filename, token):
+    return _client.fetch_peers(filename)
+
+# One connected client per (hostname, tracker, port, folder) for the whole
+# process, so reruns and other sessions reuse the same sockets and listener
+# thread. P2PClient serializes its server round trips, so sessions can share
+# it. Each entry counts the sessions using it; the last one to disconnect
+# shuts it down. A failed connect raises, which cache_resource does not cache.
+@st.cache_resource(ttl=None, show_spinner=False)
+def get_client(hostname, server_host, server_port, p2p_port, shared_folder):
+    os.makedirs(shared_folder, exist_ok=True)
+    client = P2PClient(
+        hostname=hostname,
+        server_host=server_host,
+        server_port=server_port,
+        p2p_port=p2p_port,
+        shared_folder=shared_folder,
+        logger=add_log,
+    )
+    if not client.connect_and_start():
+        client.shutdown()
+        raise ConnectionError(f"could not connect to {server_host}:{server_port}")
+    return {"client": client, "users": 0, "closed": False, "lock": threading.Lock()}
+
+def acquire_client(*key):
+    """Cached client entry for these settings, counted as used by this session.
+    
+    A cached client whose server connection has died is shut down and
+    replaced by a fresh one.
+    """
+    for _ in range(2):
+        entry = get_client(*key)
+        with entry["lock"]:
+            if not entry["closed"] and entry["client"].is_connected():
+                entry["users"] += 1
+                return entry
+            if not entry["closed"]:
+                entry["closed"] = True
+                entry["client"].shutdown()
+        get_client.clear(*key)
+    raise ConnectionError("server connection lost")
+
+def release_client(entry):
+    """Drop this session's use of entry; the last user shuts the client down"""
+    with entry["lock"]:
+        entry["users"] -= 1
+        if entry["users"] > 0 or entry["closed"]:
+            return
+        entry["closed"] = True
+        entry["client"].shutdown()
+    client = entry["client"]
+    get_client.clear(client.hostname, client.server_host, client.server_port,
+                     client.p2p_port, client.shared_folder)
+
+# Connection status reruns on its own every 30s; the rest of the page only
+# reruns on user action
+@st.fragment(run_every=30)
+def connection_status():
+    if st.session_state.client is None:
+        return
+    st.session_state.last_refresh = datetime.now().strftime("%H:%M:%S")
+    if not st.session_state.client.is_connected():
+        st.error("Server connection lost. Disconnect and connect again.")
+        return
+    st.success(f"Connected as **{st.session_state.client.hostname}**")
+    st.caption(f"Status refreshed at {st.session_state.last_refresh}")
+
+# Peer downloads run on a background thread so the page stays responsive;
+# the thread only touches its own state dict (and add_log, via the script
+# context attached in start_download)
+def _download_job(client, peer, filename, state):
+    def progress(done, total):
+        state["done"], state["total"] = done, total
+    ok = client.download_from_peer_with_progress(peer['ip'], peer['port'], filename, progress)
+    state["status"] = "ok" if ok else "failed"
+
+def start_download(peer, filename):
+    # Keyed by filename alone: two peers writing the same local file at
+    # once would interleave their data
+    if filename in st.session_state.downloads:
+        return
+    state = {"filename": filename, "peer": peer['hostname'], "done": 0, "total": 0, "status": "running"}
+    st.session_state.downloads[filename] = state
+    t = threading.Thread(target=_download_job, args=(st.session_state.client, peer, filename, state), daemon=True)
+    add_script_run_ctx(t)
+    t.start()
+
+# Polls download progress without rerunning the page; once everything has
+# finished, publishes the new files and triggers one full rerun
+@st.fragment(run_every=0.25)
+def download_progress():
+    downloads = st.session_state.downloads
+    running = [s for s in downloads.values() if s["status"] == "running"]
+    for state in running:
+        pct = int(state["done"] * 100 / state["total"]) if state["total"] > 0 else 0
+        st.progress(pct, text=f"Downloading '{state['filename']}' from {state['peer']}... {pct}%")
+    if running or not downloads:
+        return
+    
+    # Publishing uses the server connection, so it stays on the script thread
+    st.session_state.downloads = {}
+    finished = []
+    for state in downloads.values():
+        filename, peer = state["filename"], state["peer"]
+        if state["status"] == "ok":
+            add_log(f"✅ Successfully downloaded '{filename}' from {peer}")
+            st.session_state.download_notices.append(("success", f"✅ Downloaded '{filename}' successfully!"))
+            finished.append(filename)
+        else:
+            add_log(f"❌ Failed to download '{filename}' from {peer}")
+            st.session_state.download_notices.append(("error", f"❌ Download of '{filename}' failed. Check logs."))
+    # Downloads land in the shared folder; publish them in one round trip
+    finished = list(dict.fromkeys(finished))
+    if finished:
+        published = st.session_state.client.publish_files(finished)
+        if published == len(finished):
+            add_log(f"📤 Published {', '.join(finished)} to network")
+        else:
+            add_log(f"⚠️ Only {published} of {len(finished)} downloaded file(s) were published")
+    st.session_state.clients_token += 1
+    st.rerun()
+
+def lookup_args():
+    c = st.session_state.client
+    return c, (c.server_host, c.server_port, c.hostname)
 
 # Connection sidebar
 with st.sidebar:
@@ -111,21 +301,19 @@ with st.sidebar:
     if not st.session_state.connected:
         if st.button("🔌 Connect to Server", type="primary"):
             shared_folder = os.path.join(os.getcwd(), "shared_files", hostname)
-            os.makedirs(shared_folder, exist_ok=True)
-            
-            st.session_state.client = P2PClient(
-                hostname=hostname,
-                server_host=server_ip,
-                server_port=int(server_port),
-                p2p_port=int(p2p_port),
-                shared_folder=shared_folder,
-                logger=add_log,
-            )
             
             with st.spinner("Connecting..."):
-                ok = st.session_state.client.connect_and_start()
+                try:
+                    entry = acquire_client(
+                        hostname, server_ip, int(server_port), int(p2p_port), shared_folder)
+                    st.session_state.client_entry = entry
+                    st.session_state.client = entry["client"]
+                    ok = True
+                except ConnectionError:
+                    ok = False
                 if ok:
                     st.session_state.connected = True
+                    st.session_state.clients = st.session_state.client.get_client_list()
                     add_log("Successfully connected to server")
                     st.success("Connected!")
                     st.rerun()
@@ -133,20 +321,293 @@ with st.sidebar:
                     add_log("Failed to connect to server")
                     st.error("Connection failed. Check logs.")
     else:
-        st.success(f"Connected as **{st.session_state.client.hostname}**")
+        connection_status()
 
         if st.button("🔌 Disconnect", type="secondary"):
-            if st.session_state.client:
-                st.session_state.client.shutdown()
+            entry = st.session_state.client_entry
+            if entry:
+                # Other sessions sharing this client keep it until they disconnect too
+                release_client(entry)
+            st.session_state.client_entry = None
             st.session_state.client = None
             st.session_state.connected = False
             st.session_state.file_owners_cache = {}
+            st.session_state.availability_fp = None
+            st.session_state.clients = []
             add_log("Disconnected from server")
             st.rerun()
     
     st.markdown("---")
     st.caption(f"📁 Shared folder: `{st.session_state.client.shared_folder if st.session_state.client else 'Not connected'}`")
 
+# Each section renders in its own fragment, so buttons inside a section only
+# rerun that section. State a click changes is read further down the same
+# run, so no extra st.rerun() is needed; only connect/disconnect and the
+# download panel (which lives outside the fragments) trigger full reruns.
+
+# Tab 1: My Files
+@st.fragment
+def render_my_files():
+    st.markdown('<div class="sub-header">📁 My Shared Files</div>', unsafe_allow_html=True)
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.info(f"Folder: `{st.session_state.client.shared_folder}`")
+    with col2:
+        # The click itself reruns this fragment, which re-reads the folder
+        st.button("Refresh Files", key="refresh_files")
+    
+    st.markdown("---")
+    
+    # Display shared files
+    try:
+        folder = st.session_state.client.shared_folder
+        mtime_ns = os.stat(folder).st_mtime_ns
+        listing = list_shared(folder, mtime_ns)
+        files = [name for name, _, _ in listing]
+        
+        if files:
+            # Check availability button; nothing to re-check while our folder,
+            # the known client set and the lookup token are unchanged. Peers
+            # publish or download our files without us seeing it, so the
+            # answer also expires every AVAILABILITY_TTL seconds.
+            fp = (mtime_ns, tuple(sorted(st.session_state.clients)),
+                  st.session_state.clients_token, int(time.time() // AVAILABILITY_TTL))
+            if st.button("🌐 Check File Availability on Network", key="check_availability"):
+                if fp == st.session_state.availability_fp:
+                    st.toast("Availability info is still fresh")
+                else:
+                    with st.spinner("Checking file availability..."):
+                        # One LOOKUP_BATCH round trip for the whole folder
+                        results = st.session_state.client.fetch_peers_batch(files)
+                        st.session_state.file_owners_cache.update(
+                            {f: {p['hostname'] for p in peers} for f, peers in results.items() if peers}
+                        )
+                        st.session_state.availability_fp = fp
+                        add_log(f"Checked availability for {len(files)} files")
+                        st.success("✅ File availability updated!")
+            
+            st.markdown("---")
+            
+            me = st.session_state.client.hostname
+            cards = []
+            for filename, _, size_str in listing:
+                name = html.escape(filename)
+                row = {"name": name, "size": size_str, "badge": "", "owners": ""}
+                
+                # Check if we have availability info, and show which clients have this file
+                owners = st.session_state.file_owners_cache.get(filename)
+                if owners:
+                    if len(owners) > 1:
+                        row["badge"] = BADGE_TMPL.format(count=len(owners))
+                    items = [f"✓ <strong>{html.escape(owner)}</strong>" for owner in sorted(owners - {me})]
+                    if me in owners:
+                        items.append(f"✓ <strong>{html.escape(me)}</strong> (You)")
+                    row["owners"] = OWNERS_TMPL.format(name=name, items="<br>".join(items))
+                
+                cards.append(FILE_CARD_TMPL.format_map(row))
+            st.markdown("\n".join(cards), unsafe_allow_html=True)
+        else:
+            st.warning("No files in your shared folder yet. Upload files in the '📤 Upload Files' tab!")
+    except Exception as e:
+        st.error(f"Error listing files: {e}")
+
+
+# Tab 2: Network Clients
+@st.fragment
+def render_network_clients():
+    st.markdown('<div class="sub-header">👥 Connected Clients</div>', unsafe_allow_html=True)
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.info("Browse files from other clients on the network")
+    with col2:
+        if st.button("🔄 Refresh Clients", key="refresh_clients"):
+            with st.spinner("Fetching client list..."):
+                st.session_state.clients_token += 1
+                st.session_state.clients = st.session_state.client.get_client_list()
+                add_log(f"Found {len(st.session_state.clients)} clients on network")
+    
+    st.markdown("---")
+    
+    # Client list as of the last connect/refresh; no tracker call on other reruns
+    other_clients = [c for c in st.session_state.clients if c != st.session_state.client.hostname]
+    
+    if other_clients:
+        # One selectbox and one table instead of a button per client and per file
+        selected = st.selectbox(
+            f"👤 View files from ({len(other_clients)} clients online)",
+            other_clients, index=None, placeholder="Choose a client", key="client_select"
+        )
+        if selected:
+            files = cached_client_files(*lookup_args(), selected,
+                                        st.session_state.clients_token) or []
+            if selected != st.session_state.selected_client:
+                add_log(f"Loaded {len(files)} files from {selected}")
+            st.session_state.selected_client = selected
+            st.session_state.client_files = files
+            
+            if files:
+                st.caption(f"📁 Files from {selected} ({len(files)} files), select one to download")
+                event = st.dataframe(
+                    {"File": files}, on_select="rerun", selection_mode="single-row",
+                    hide_index=True, use_container_width=True, key="client_files_table"
+                )
+                if event.selection.rows:
+                    filename = files[event.selection.rows[0]]
+                    if st.button(f"⬇️ Download {filename}", key="dl_client_file"):
+                        st.session_state.search_file = filename
+                        st.info(f"Go to '🔍 Search & Download' tab to download '{filename}'")
+                        add_log(f"Selected {filename} for download")
+            else:
+                st.caption(f"{selected} is not sharing any files")
+    else:
+        st.warning("👥 No other clients connected. Press Refresh Clients to check again!")
+
+
+# Tab 3: Search & Download
+@st.fragment
+def render_search():
+    st.markdown('<div class="sub-header">🔍 Search & Download Files</div>', unsafe_allow_html=True)
+    
+    # Search box
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        search_file = st.text_input("Enter filename to search:", key="search_file_input", 
+                                   value=st.session_state.get('search_file', ''))
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        search_btn = st.button("🔍 Search", type="primary", key="search_btn")
+    
+    if search_btn and search_file:
+        with st.spinner(f"Searching for '{search_file}'..."):
+            peers = cached_fetch_peers(*lookup_args(), search_file,
+                                       st.session_state.clients_token)
+            st.session_state.search_results = peers
+            if peers:
+                st.session_state.file_owners_cache[search_file] = {p['hostname'] for p in peers}
+                add_log(f"Found {len(peers)} peer(s) with '{search_file}'")
+            else:
+                add_log(f"No peers found with '{search_file}'")
+    
+    st.markdown("---")
+    
+    # Display search results
+    if st.session_state.search_results:
+        st.success(f"✅ Found {len(st.session_state.search_results)} peer(s) with '{search_file}'")
+        
+        for i, peer in enumerate(st.session_state.search_results, 1):
+            st.markdown(f"""
+            <div class="success-card">
+                <strong>Peer {i}: {peer['hostname']}</strong><br>
+                <small>📍 Address: {peer['ip']}:{peer['port']}</small>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # Download button
+            if st.button(f"⬇️ Download from {peer['hostname']}", key=f"download_{i}_{peer['hostname']}"):
+                start_download(peer, search_file)
+                st.rerun()
+            
+            st.markdown("<br>", unsafe_allow_html=True)
+    elif hasattr(st.session_state, 'search_file') and st.session_state.search_file:
+        st.warning(f"❌ No peers found with '{st.session_state.search_file}'. Try a different filename.")
+
+
+# Tab 4: Upload Files
+@st.fragment
+def render_upload():
+    st.markdown('<div class="sub-header">📤 Upload & Publish Files</div>', unsafe_allow_html=True)
+    st.info("Upload files to your shared folder and publish them to the network")
+    
+    uploaded_files = st.file_uploader(
+        "Choose files to upload and share",
+        accept_multiple_files=True,
+        key="file_uploader"
+    )
+    
+    if uploaded_files:
+        st.markdown("---")
+        st.subheader("📋 Files to upload:")
+        
+        for uploaded_file in uploaded_files:
+            col1, col2, col3 = st.columns([2, 1, 1])
+            with col1:
+                st.markdown(f"📄 **{uploaded_file.name}**")
+            with col2:
+                st.caption(f"Size: {format_size(uploaded_file.size)}")
+            with col3:
+                st.caption("✓ Ready")
+        
+        st.markdown("---")
+        
+        if st.button("📤 Upload & Publish All Files", type="primary", key="upload_publish"):
+            progress_bar = st.progress(0, text="Uploading files...")
+            client = st.session_state.client
+            total = len(uploaded_files)
+            
+            def save(uploaded_file):
+                # Streams the already-open upload straight into the shared folder
+                client.store_stream(uploaded_file, uploaded_file.name)
+                return uploaded_file.name
+            
+            # Save files concurrently; progress is reported from this thread
+            saved = []
+            with ThreadPoolExecutor(max_workers=8) as ex:
+                futures = [ex.submit(save, u) for u in uploaded_files]
+                for i, fut in enumerate(as_completed(futures), 1):
+                    try:
+                        saved.append(fut.result())
+                    except OSError as e:
+                        add_log(f"❌ Could not save upload: {e}")
+                    progress_bar.progress(i / total, text=f"Saving {i}/{total}...")
+            
+            # Publish everything in one round trip on the shared server connection
+            progress_bar.progress(1.0, text="Publishing...")
+            published = st.session_state.client.publish_files(saved)
+            if saved and published == len(saved):
+                for name in saved:
+                    add_log(f"✅ Uploaded and published: {name}")
+            elif saved:
+                # The server reports a count, not which names it took
+                add_log(f"⚠️ Uploaded {len(saved)} file(s) but only {published} were published: {', '.join(saved)}")
+            
+            st.session_state.clients_token += 1
+            if len(saved) == total:
+                st.success(f"✅ Successfully uploaded {len(saved)} file(s)!")
+            else:
+                st.warning(f"Uploaded {len(saved)} of {total} file(s). Check logs.")
+            add_log(f"Uploaded {len(saved)} files to shared folder")
+
+
+# Tab 5: Activity Log
+@st.fragment
+def render_activity_log():
+    st.markdown('<div class="sub-header">📋 Activity Log</div>', unsafe_allow_html=True)
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.info(f"Showing last {len(st.session_state.logs)} activities")
+    with col2:
+        if st.button("🗑️ Clear Log", key="clear_log"):
+            st.session_state.logs.clear()
+            st.rerun(scope="fragment")
+    
+    st.markdown("---")
+    
+    # Display logs in reverse order (newest first)
+    if st.session_state.logs:
+        # One table element instead of an alert box per line
+        rows = list(islice(reversed(st.session_state.logs), 50))  # Show last 50 logs
+        times, levels, messages = zip(*rows)
+        st.dataframe(
+            {"Time": times, "Level": levels, "Message": messages},
+            hide_index=True, use_container_width=True
+        )
+    else:
+        st.caption("No activity yet. Interact with the application to see logs here.")
+
+
 # Main content area
 if not st.session_state.connected:
     st.markdown('<div class="main-header">Welcome to P2P File Sharing! 🚀</div>', unsafe_allow_html=True)
@@ -179,294 +640,28 @@ if not st.session_state.connected:
     #     - Activity logs
     #     """)
 else:
-    # Create tabs for different sections
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📁 My Files", 
-        "👥 Network Clients", 
-        "🔍 Search & Download",
-        "📤 Upload Files",
-        "📋 Activity Log"
-    ])
-    
-    # Tab 1: My Files
-    with tab1:
-        st.markdown('<div class="sub-header">📁 My Shared Files</div>', unsafe_allow_html=True)
-        
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            st.info(f"Folder: `{st.session_state.client.shared_folder}`")
-        with col2:
-            if st.button("Refresh Files", key="refresh_files"):
-                st.rerun()
-        
-        st.markdown("---")
-        
-        # Display shared files
-        try:
-            files = sorted([f for f in os.listdir(st.session_state.client.shared_folder) 
-                          if os.path.isfile(os.path.join(st.session_state.client.shared_folder, f))])
-            
-            if files:
-                # Check availability button
-                if st.button("🌐 Check File Availability on Network", key="check_availability"):
-                    with st.spinner("Checking file availability..."):
-                        for filename in files:
-                            peers = st.session_state.client.fetch_peers(filename)
-                            if peers:
-                                st.session_state.file_owners_cache[filename] = [p['hostname'] for p in peers]
-                        add_log(f"Checked availability for {len(files)} files")
-                        st.success("✅ File availability updated!")
-                        st.rerun()
-                
-                st.markdown("---")
-                
-                for filename in files:
-                    filepath = os.path.join(st.session_state.client.shared_folder, filename)
-                    filesize = os.path.getsize(filepath)
-                    size_str = f"{filesize:,} bytes" if filesize < 1024 else f"{filesize/1024:.1f} KB" if filesize < 1024*1024 else f"{filesize/(1024*1024):.1f} MB"
-                    
-                    # Check if we have availability info
-                    availability = ""
-                    if filename in st.session_state.file_owners_cache:
-                        owners = st.session_state.file_owners_cache[filename]
-                        if len(owners) > 1:
-                            availability = f'<span class="info-badge">{len(owners)} clients</span>'
-                    
-                    st.markdown(f"""
-                    <div class="file-card">
-                        <strong>📄 {filename}</strong> {availability}<br>
-                        <small>Size: {size_str}</small>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Show which clients have this file
-                    if filename in st.session_state.file_owners_cache:
-                        with st.expander(f"View clients with '{filename}'"):
-                            owners = st.session_state.file_owners_cache[filename]
-                            for owner in owners:
-                                if owner != st.session_state.client.hostname:
-                                    st.markdown(f"✓ **{owner}**")
-                                else:
-                                    st.markdown(f"✓ **{owner}** (You)")
-            else:
-                st.warning("No files in your shared folder yet. Upload files in the '📤 Upload Files' tab!")
-        except Exception as e:
-            st.error(f"Error listing files: {e}")
-    
-    # Tab 2: Network Clients
-    with tab2:
-        st.markdown('<div class="sub-header">👥 Connected Clients</div>', unsafe_allow_html=True)
-        
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            st.info("Browse files from other clients on the network")
-        with col2:
-            if st.button("🔄 Refresh Clients", key="refresh_clients"):
-                with st.spinner("Fetching client list..."):
-                    clients = st.session_state.client.get_client_list()
-                    add_log(f"Found {len(clients)} clients on network")
-                    st.rerun()
-        
-        st.markdown("---")
-        
-        # Get client list
-        clients = st.session_state.client.get_client_list()
-        other_clients = [c for c in clients if c != st.session_state.client.hostname]
-        
-        if other_clients:
-            for client_hostname in other_clients:
-                st.markdown(f"""
-                <div class="client-card">
-                    <strong>👤 {client_hostname}</strong>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Button to view files
-                if st.button(f"📂 View files from {client_hostname}", key=f"view_{client_hostname}"):
-                    with st.spinner(f"Loading files from {client_hostname}..."):
-                        files = st.session_state.client.get_client_files(client_hostname)
-                        st.session_state.selected_client = client_hostname
-                        st.session_state.client_files = files if files else []
-                        add_log(f"Loaded {len(st.session_state.client_files)} files from {client_hostname}")
-                
-                # Show files if this client is selected
-                if st.session_state.selected_client == client_hostname and st.session_state.client_files:
-                    with st.expander(f"📁 Files from {client_hostname} ({len(st.session_state.client_files)} files)", expanded=True):
-                        for filename in st.session_state.client_files:
-                            col1, col2 = st.columns([3, 1])
-                            with col1:
-                                st.markdown(f"📄 **{filename}**")
-                            with col2:
-                                if st.button("⬇️ Download", key=f"dl_{client_hostname}_{filename}"):
-                                    st.session_state.search_file = filename
-                                    st.info(f"Go to '🔍 Search & Download' tab to download '{filename}'")
-                                    add_log(f"Selected {filename} for download")
-        else:
-            st.warning("👥 No other clients connected. Try refreshing!")
+    # Only the selected section is rendered, so hidden sections cost nothing
+    # (no tracker lookups for Network Clients while reading the log, etc.)
+    views = {
+        "📁 My Files": render_my_files,
+        "👥 Network Clients": render_network_clients,
+        "🔍 Search & Download": render_search,
+        "📤 Upload Files": render_upload,
+        "📋 Activity Log": render_activity_log,
+    }
+    active = st.radio("Section", list(views), horizontal=True,
+                      label_visibility="collapsed", key="active_tab")
     
-    # Tab 3: Search & Download
-    with tab3:
-        st.markdown('<div class="sub-header">🔍 Search & Download Files</div>', unsafe_allow_html=True)
-        
-        # Search box
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            search_file = st.text_input("Enter filename to search:", key="search_file_input", 
-                                       value=st.session_state.get('search_file', ''))
-        with col2:
-            st.markdown("<br>", unsafe_allow_html=True)
-            search_btn = st.button("🔍 Search", type="primary", key="search_btn")
-        
-        if search_btn and search_file:
-            with st.spinner(f"Searching for '{search_file}'..."):
-                peers = st.session_state.client.fetch_peers(search_file)
-                st.session_state.search_results = peers
-                if peers:
-                    st.session_state.file_owners_cache[search_file] = [p['hostname'] for p in peers]
-                    add_log(f"Found {len(peers)} peer(s) with '{search_file}'")
-                else:
-                    add_log(f"No peers found with '{search_file}'")
-                st.rerun()
-        
-        st.markdown("---")
-        
-        # Display search results
-        if st.session_state.search_results:
-            st.success(f"✅ Found {len(st.session_state.search_results)} peer(s) with '{search_file}'")
-            
-            for i, peer in enumerate(st.session_state.search_results, 1):
-                st.markdown(f"""
-                <div class="success-card">
-                    <strong>Peer {i}: {peer['hostname']}</strong><br>
-                    <small>📍 Address: {peer['ip']}:{peer['port']}</small>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Download button
-                if st.button(f"⬇️ Download from {peer['hostname']}", key=f"download_{i}_{peer['hostname']}"):
-                    progress_bar = st.progress(0, text="Starting download...")
-                    status_text = st.empty()
-                    
-                    def progress_callback(done, total):
-                        if total > 0:
-                            pct = int((done / total) * 100)
-                            progress_bar.progress(pct, text=f"Downloading... {pct}%")
-                    
-                    with st.spinner(f"Downloading '{search_file}' from {peer['hostname']}..."):
-                        ok = st.session_state.client.download_from_peer_with_progress(
-                            peer['ip'], peer['port'], search_file, progress_callback
-                        )
-                        
-                        if ok:
-                            add_log(f"✅ Successfully downloaded '{search_file}' from {peer['hostname']}")
-                            status_text.success(f"✅ Downloaded '{search_file}' successfully!")
-                            
-                            # Try to publish the downloaded file
-                            try:
-                                filepath = os.path.join(st.session_state.client.shared_folder, search_file)
-                                st.session_state.client.publish_file(filepath, search_file)
-                                add_log(f"📤 Published '{search_file}' to network")
-                            except Exception as e:
-                                add_log(f"⚠️ Could not publish downloaded file: {e}")
-                            
-                            time.sleep(1)
-                            st.rerun()
-                        else:
-                            add_log(f"❌ Failed to download '{search_file}' from {peer['hostname']}")
-                            status_text.error(f"❌ Download failed. Check logs.")
-                
-                st.markdown("<br>", unsafe_allow_html=True)
-        elif hasattr(st.session_state, 'search_file') and st.session_state.search_file:
-            st.warning(f"❌ No peers found with '{st.session_state.search_file}'. Try a different filename.")
+    # Downloads in flight and results of the ones that just finished; shown
+    # in every section so a running download always gets polled to completion
+    for kind, notice in st.session_state.download_notices:
+        getattr(st, kind)(notice)
+    st.session_state.download_notices = []
+    if st.session_state.downloads:
+        download_progress()
     
-    # Tab 4: Upload Files
-    with tab4:
-        st.markdown('<div class="sub-header">📤 Upload & Publish Files</div>', unsafe_allow_html=True)
-        st.info("Upload files to your shared folder and publish them to the network")
-        
-        uploaded_files = st.file_uploader(
-            "Choose files to upload and share",
-            accept_multiple_files=True,
-            key="file_uploader"
-        )
-        
-        if uploaded_files:
-            st.markdown("---")
-            st.subheader("📋 Files to upload:")
-            
-            for uploaded_file in uploaded_files:
-                col1, col2, col3 = st.columns([2, 1, 1])
-                with col1:
-                    st.markdown(f"📄 **{uploaded_file.name}**")
-                with col2:
-                    size = len(uploaded_file.getvalue())
-                    size_str = f"{size:,} bytes" if size < 1024 else f"{size/1024:.1f} KB" if size < 1024*1024 else f"{size/(1024*1024):.1f} MB"
-                    st.caption(f"Size: {size_str}")
-                with col3:
-                    st.caption("✓ Ready")
-            
-            st.markdown("---")
-            
-            if st.button("📤 Upload & Publish All Files", type="primary", key="upload_publish"):
-                progress_bar = st.progress(0, text="Uploading files...")
-                
-                for i, uploaded_file in enumerate(uploaded_files):
-                    # Save file
-                    filepath = os.path.join(st.session_state.client.shared_folder, uploaded_file.name)
-                    with open(filepath, "wb") as f:
-                        f.write(uploaded_file.getvalue())
-                    
-                    # Publish file
-                    ok = st.session_state.client.publish_file(filepath, uploaded_file.name)
-                    
-                    if ok:
-                        add_log(f"✅ Uploaded and published: {uploaded_file.name}")
-                    else:
-                        add_log(f"⚠️ Uploaded but failed to publish: {uploaded_file.name}")
-                    
-                    progress_bar.progress((i + 1) / len(uploaded_files), 
-                                        text=f"Processing {i+1}/{len(uploaded_files)}...")
-                
-                st.success(f"✅ Successfully uploaded {len(uploaded_files)} file(s)!")
-                add_log(f"Uploaded {len(uploaded_files)} files to shared folder")
-                time.sleep(1)
-                st.rerun()
-    
-    # Tab 5: Activity Log
-    with tab5:
-        st.markdown('<div class="sub-header">📋 Activity Log</div>', unsafe_allow_html=True)
-        
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            st.info(f"Showing last {len(st.session_state.logs)} activities")
-        with col2:
-            if st.button("🗑️ Clear Log", key="clear_log"):
-                st.session_state.logs = []
-                st.rerun()
-        
-        st.markdown("---")
-        
-        # Display logs in reverse order (newest first)
-        if st.session_state.logs:
-            log_container = st.container()
-            with log_container:
-                for log in reversed(st.session_state.logs[-50:]):  # Show last 50 logs
-                    # Color code based on content
-                    if "✅" in log or "Successfully" in log:
-                        st.success(log)
-                    elif "❌" in log or "Failed" in log or "Error" in log:
-                        st.error(log)
-                    elif "⚠️" in log or "Warning" in log:
-                        st.warning(log)
-                    else:
-                        st.info(log)
-        else:
-            st.caption("No activity yet. Interact with the application to see logs here.")
+    views[active]()
 
 # Footer
 st.markdown("---")
 st.caption("🔄 P2P File Sharing Application | Built with Streamlit | 2025")
-
-# Auto-refresh every 30 seconds when connected
-if st.session_state.connected:
-    time.sleep(0.1)  # Small delay to prevent too frequent updates
@@ -4,20 +4,33 @@ import os
 import sys
 import time
 import math
-import queue
 import shutil
 import signal
+import asyncio
 import random
 import string
 import threading
 import subprocess
 import re
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import List, Optional, Tuple, Dict, Callable
 
+# Optional: match all watched substrings in one pass per line
+try:
+    import ahocorasick
+    HAS_AHOCORASICK = True
+except ImportError:
+    HAS_AHOCORASICK = False
+
 ROOT = os.path.dirname(os.path.abspath(__file__))
 PY = sys.executable or "python"
 
+# Log line patterns, compiled once
+_TS_RE = re.compile(r"^\[(\d{2}):(\d{2}):(\d{2})\]")
+_FILE_SIZE_RE = re.compile(r"File size:\s*(\d+) bytes")
+
 
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
@@ -25,76 +38,225 @@ def ensure_dir(path: str):
 
 def write_bin(filepath: str, size_bytes: int):
     ensure_dir(os.path.dirname(filepath))
-    # Write in chunks to avoid large memory use
-    chunk = b"\0" * (1024 * 1024)  # 1 MiB chunk of zeros
-    remaining = size_bytes
     with open(filepath, "wb") as f:
+        # The payload is all zeros, so a sparse file reads back identically
+        # and costs a metadata update instead of size_bytes of disk writes
+        try:
+            os.ftruncate(f.fileno(), size_bytes)
+            return
+        except (AttributeError, OSError):
+            pass
+        # Last resort: write in chunks to avoid large memory use. Slicing the
+        # memoryview for the tail does not copy the buffer.
+        chunk = memoryview(bytes(8 * 1024 * 1024))  # 8 MiB of zeros
+        remaining = size_bytes
         while remaining > 0:
             n = min(len(chunk), remaining)
-            f.write(chunk[:n])
+            f.write(chunk if n == len(chunk) else chunk[:n])
             remaining -= n
 
 
+def file_size_or_none(path: str) -> Optional[int]:
+    # One stat answers both "exists?" and "how big?"
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
+
+
+def reset_download(cli_dir: str, fname: str):
+    """Remove an earlier downloaded copy so the next fetch starts from scratch"""
+    try:
+        os.unlink(os.path.join(cli_dir, fname))
+    except FileNotFoundError:
+        pass
+
+
 def now_monotonic():
     return time.monotonic()
 
 
-class ManagedProcess:
-    def __init__(self, args: List[str], cwd: Optional[str] = None, name: str = "proc"):
-        self.name = name
-        self.proc = subprocess.Popen(
-            args,
-            cwd=cwd or ROOT,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            bufsize=1,
-            universal_newlines=True,
+@functools.lru_cache(maxsize=None)
+def _compile(pattern: bytes) -> "re.Pattern[bytes]":
+    return re.compile(pattern)
+
+
+def _decode(line: bytes) -> str:
+    return line.decode("utf-8", "replace")
+
+
+class _IoMux:
+    """Background asyncio loop that owns every child process.
+
+    Children are spawned with create_subprocess_exec so one loop thread
+    services all of their pipes on every platform (the default Windows loop
+    is the Proactor, which reads pipes too). Output callbacks get each chunk
+    read and b"" once at EOF, on the loop thread.
+    """
+
+    _instance: Optional["_IoMux"] = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> "_IoMux":
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="io-mux", daemon=True).start()
+
+    def call(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the loop and block for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def spawn(self, args: List[str], cwd: str, on_data: Callable[[bytes], None]) -> asyncio.subprocess.Process:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            cwd=cwd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
             creationflags=(getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0) if os.name == "nt" else 0),
         )
-        self._lines: List[str] = []
-        self._q: "queue.Queue[str]" = queue.Queue()
-        self._t = threading.Thread(target=self._reader, daemon=True)
-        self._t.start()
+        self.loop.create_task(self._pump(proc.stdout, on_data))
+        return proc
 
-    def _reader(self):
-        try:
-            assert self.proc.stdout is not None
-            for line in self.proc.stdout:
-                self._lines.append(line.rstrip("\n"))
-                self._q.put(line.rstrip("\n"))
-        except Exception:
-            pass
+    @staticmethod
+    async def _pump(stream: asyncio.StreamReader, on_data: Callable[[bytes], None]):
+        while True:
+            try:
+                data = await stream.read(65536)
+            except Exception:
+                data = b""
+            try:
+                on_data(data)
+            except Exception:
+                pass
+            if not data:
+                return
+
+
+class ManagedProcess:
+    def __init__(self, args: List[str], cwd: Optional[str] = None, name: str = "proc"):
+        self.name = name
+        # Output is kept as raw bytes lines; only the lines a caller actually
+        # matches are decoded
+        self._lines: List[bytes] = []
+        self._buf = bytearray()
+        # Guards _lines; the reader notifies it for every new batch of lines
+        self._cond = threading.Condition()
+        # One-shot (substring, event, capture) watches checked as lines arrive
+        self._watches: List[Tuple[bytes, threading.Event, List[str]]] = []
+        # Automaton over the watched substrings, rebuilt when watches change
+        self._automaton = None
+        self._mux = _IoMux.get()
+        self.proc = self._mux.call(self._mux.spawn(args, cwd or ROOT, self._on_data))
+
+    def _on_data(self, data: bytes):
+        if not data:
+            if self._buf:
+                self._add_lines([bytes(self._buf).rstrip(b"\r")])
+                self._buf.clear()
+            return
+        if b"\n" not in data:
+            self._buf += data
+            return
+        # Split the chunk itself; only a partial line carried over from the
+        # previous read is copied, instead of staging every chunk in _buf
+        *complete, rest = data.split(b"\n")
+        if self._buf:
+            self._buf += complete[0]
+            complete[0] = bytes(self._buf)
+        self._buf = bytearray(rest)
+        self._add_lines([raw.rstrip(b"\r") for raw in complete])
+
+    def _add_lines(self, lines: List[bytes]):
+        with self._cond:
+            self._lines.extend(lines)
+            if self._watches:
+                for ln in lines:
+                    self._fire_watches(ln)
+            self._cond.notify_all()
+
+    def _fire_watches(self, ln: bytes):
+        if HAS_AHOCORASICK:
+            if self._automaton is None:
+                self._automaton = ahocorasick.Automaton()
+                for sub in {w[0] for w in self._watches}:
+                    # latin-1 maps bytes 1:1, so str matching equals byte matching
+                    self._automaton.add_word(sub.decode("latin-1"), sub)
+                self._automaton.make_automaton()
+            found = {sub for _, sub in self._automaton.iter(ln.decode("latin-1"))}
+            if not found:
+                return
+            hit = [w for w in self._watches if w[0] in found]
+        else:
+            hit = [w for w in self._watches if w[0] in ln]
+        if hit:
+            self._automaton = None
+        for w in hit:
+            self._watches.remove(w)
+            w[2].append(_decode(ln))
+            w[1].set()
+
+    def add_watch(self, substring: str, event: threading.Event, capture: List[str]):
+        """Set `event` and append the line to `capture` on the next line containing `substring`"""
+        with self._cond:
+            self._watches.append((substring.encode(), event, capture))
+            self._automaton = None
+
+    def remove_watch(self, event: threading.Event):
+        with self._cond:
+            self._watches = [w for w in self._watches if w[1] is not event]
+            self._automaton = None
 
     def send(self, line: str):
+        # StreamWriter is not thread-safe; queue the write onto the loop,
+        # which keeps commands in order
         if self.proc.stdin:
-            self.proc.stdin.write(line + "\n")
-            self.proc.stdin.flush()
-
-    def wait_for(self, pattern: str, timeout: float = 15.0, regex: bool = False) -> Optional[str]:
-        end = time.time() + timeout
-        compiled = re.compile(pattern) if regex else None
-        lines_snapshot = list(self._lines)
-        for ln in lines_snapshot:
-            if (compiled.search(ln) if compiled else (pattern in ln)):
-                return ln
-        while time.time() < end:
-            try:
-                ln = self._q.get(timeout=0.2)
-            except queue.Empty:
-                continue
-            if (compiled.search(ln) if compiled else (pattern in ln)):
-                return ln
-        return None
+            self._mux.loop.call_soon_threadsafe(self.proc.stdin.write, (line + "\n").encode())
+
+    def mark(self) -> int:
+        """Cursor for wait_for that skips everything printed so far"""
+        return len(self._lines)
+
+    def wait_for(self, pattern: "str | re.Pattern[bytes]", timeout: float = 15.0, regex: bool = False, cursor: int = 0) -> Optional[str]:
+        # A compiled (bytes) pattern is searched as is; a str is a substring
+        # unless regex=True. Only the matching line is decoded.
+        end = time.monotonic() + timeout
+        if isinstance(pattern, re.Pattern):
+            compiled, needle = pattern, b""
+        else:
+            needle = pattern.encode()
+            compiled = _compile(needle) if regex else None
+        with self._cond:
+            while True:
+                while cursor < len(self._lines):
+                    ln = self._lines[cursor]
+                    cursor += 1
+                    if (compiled.search(ln) if compiled else (needle in ln)):
+                        return _decode(ln)
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def lines_since(self, cursor: int) -> Tuple[List[str], int]:
+        """Lines printed after `cursor`, plus the cursor to pass next time"""
+        with self._cond:
+            return [_decode(ln) for ln in self._lines[cursor:]], len(self._lines)
 
     def lines(self) -> List[str]:
-        return list(self._lines)
+        return self.lines_since(0)[0]
 
-    def kill(self):
+    async def _stop(self):
         try:
             if os.name == "nt":
                 try:
-                    self.proc.send_signal(signal.CTRL_BREAK_EVENT) 
+                    self.proc.send_signal(signal.CTRL_BREAK_EVENT)
                 except Exception:
                     self.proc.terminate()
             else:
@@ -102,13 +264,19 @@ class ManagedProcess:
         except Exception:
             pass
         try:
-            self.proc.wait(timeout=5)
+            await asyncio.wait_for(self.proc.wait(), timeout=5)
         except Exception:
             try:
                 self.proc.kill()
             except Exception:
                 pass
 
+    def kill(self):
+        try:
+            self._mux.call(self._stop(), timeout=10)
+        except Exception:
+            pass
+
 
 def start_server(port: int = 8000) -> ManagedProcess:
     args = [PY, os.path.join(ROOT, "server.py"), str(port)]
@@ -135,14 +303,16 @@ def start_client(hostname: str, server_host: str, server_port: int, p2p_port: in
     # Wait for register success and P2P listener
     if not cli.wait_for("REGISTER_SUCCESS", timeout=30):
         raise RuntimeError(f"Client {hostname} failed to register.")
-    # Do not block waiting for P2P listener; give a short grace period.
-    time.sleep(2.0)
+    # The listener starts right after registration; wait for its log line
+    # rather than sleeping a fixed grace period
+    if not cli.wait_for("P2P server listening on port", timeout=5):
+        raise RuntimeError(f"Client {hostname} P2P listener did not start.")
     return cli
 
 
 def parse_timestamp(line: str) -> Optional[Tuple[int, int, int]]:
     # Expected format: [HH:MM:SS] message
-    m = re.match(r"^\[(\d{2}):(\d{2}):(\d{2})\]", line)
+    m = _TS_RE.match(line)
     if not m:
         return None
     return int(m.group(1)), int(m.group(2)), int(m.group(3))
@@ -154,37 +324,37 @@ def ts_to_seconds(ts: Tuple[int, int, int]) -> int:
 
 
 def publish(cli: ManagedProcess, local: str, shared: str, timeout: float = 60.0):
+    cursor = cli.mark()
     cli.send(f"publish {local} {shared}")
-    ok = cli.wait_for("PUBLISH_SUCCESS", timeout=timeout)
+    ok = cli.wait_for("PUBLISH_SUCCESS", timeout=timeout, cursor=cursor)
     if not ok:
         # Dump recent lines for troubleshooting
-        recent = "\n".join(cli.lines()[-20:])
+        recent = "\n".join(cli.lines_since(max(0, cli.mark() - 20))[0])
         raise RuntimeError(f"Publish of {local}->{shared} failed or timed out. Recent output:\n{recent}")
 
 
 def fetch_and_measure(cli: ManagedProcess, filename: str, timeout: float = 120.0) -> Tuple[float, int]:
-    start_snapshot = len(cli.lines())
-    cli.send(f"fetch {filename}")
-    size_line = None
-    complete_line = None
-    end_time = time.time() + timeout
+    # The reader matches each line once as it arrives, so nothing is rescanned
+    size_ev, done_ev = threading.Event(), threading.Event()
+    size_cap: List[str] = []
+    done_cap: List[str] = []
+    cli.add_watch("File size:", size_ev, size_cap)
+    cli.add_watch("Download complete:", done_ev, done_cap)
     file_size = -1
+    # Clock starts right before the command and stops as soon as the reader
+    # sets the completion event, with no polling interval in between
     t0 = now_monotonic()
-    while time.time() < end_time:
-        cli.wait_for("", timeout=0.2)  # drain / allow reader to populate
-        lines = cli.lines()[start_snapshot:]
-        for l in lines:
-            if size_line is None and "File size:" in l:
-                size_line = l
-                m = re.search(r"File size:\s*(\d+) bytes", l)
-                if m:
-                    file_size = int(m.group(1))
-            if complete_line is None and "Download complete:" in l:
-                complete_line = l
-        if size_line and complete_line:
-            break
+    cli.send(f"fetch {filename}")
+    end_time = t0 + timeout
+    if size_ev.wait(timeout):
+        m = _FILE_SIZE_RE.search(size_cap[0])
+        if m:
+            file_size = int(m.group(1))
+        done_ev.wait(max(0.0, end_time - now_monotonic()))
     t1 = now_monotonic()
-    if not size_line or not complete_line:
+    if not size_ev.is_set() or not done_ev.is_set():
+        cli.remove_watch(size_ev)
+        cli.remove_watch(done_ev)
         raise RuntimeError(f"Did not observe size/completion logs for {filename}")
     elapsed = max(0.0, t1 - t0)
     # Guard against extremely small elapsed values (<1ms) that would produce infinity speeds.
@@ -228,9 +398,11 @@ def test1_file_transfer_speed(base_port: int = 8000) -> List[TestResult]:
     # Create test files in client1
     for name, size in files:
         path = os.path.join(client1_dir, name)
-        if not os.path.exists(path) or os.path.getsize(path) != size:
+        if file_size_or_none(path) != size:
             print(f"Creating {name} ({size} bytes)...")
             write_bin(path, size)
+        # Copies left by an earlier run would be auto-published by client2
+        reset_download(client2_dir, name)
 
     srv = start_server(base_port)
     try:
@@ -265,7 +437,7 @@ def test1_file_transfer_speed(base_port: int = 8000) -> List[TestResult]:
         srv.kill()
 
 
-def test2_peer_concurrency(base_port: int = 8000) -> List[TestResult]:
+def test2_peer_concurrency(base_port: int = 8000, baseline_override: Optional[float] = None) -> List[TestResult]:
     print("\n=== Test 2: Peer Concurrency (Upload Test) ===")
     results: List[TestResult] = []
 
@@ -278,9 +450,12 @@ def test2_peer_concurrency(base_port: int = 8000) -> List[TestResult]:
 
     # Ensure medium.bin exists and published by client1
     medium_path = os.path.join(client1_dir, "medium.bin")
-    if not os.path.exists(medium_path) or os.path.getsize(medium_path) != 20 * 1024 * 1024:
+    if file_size_or_none(medium_path) != 20 * 1024 * 1024:
         print("Creating medium.bin (20 MiB)...")
         write_bin(medium_path, 20 * 1024 * 1024)
+    # Only client1 may seed; stale copies would be auto-published at startup
+    for d in [client2_dir, client3_dir, client4_dir]:
+        reset_download(d, "medium.bin")
 
     srv = start_server(base_port)
     c1 = c2 = c3 = c4 = None
@@ -294,8 +469,12 @@ def test2_peer_concurrency(base_port: int = 8000) -> List[TestResult]:
         publish(c1, "medium.bin", "medium.bin")
 
         # Baseline from Test 1 for comparison (download medium.bin on client2 alone)
-        print("Measuring baseline single-download time (client2 only)...")
-        base_time, _ = fetch_and_measure(c2, "medium.bin", timeout=600.0)
+        if baseline_override is not None:
+            base_time = baseline_override
+            print(f"Using Test 1 medium.bin time as baseline: {base_time:.3f}s")
+        else:
+            print("Measuring baseline single-download time (client2 only)...")
+            base_time, _ = fetch_and_measure(c2, "medium.bin", timeout=600.0)
 
         # Concurrent fetch on c2, c3, c4
         print("Starting 3 concurrent downloads of medium.bin (clients 2,3,4)...")
@@ -303,8 +482,10 @@ def test2_peer_concurrency(base_port: int = 8000) -> List[TestResult]:
         sizes: Dict[str, int] = {}
         lock = threading.Lock()
 
-        def worker(cli: ManagedProcess, name: str):
+        def worker(cli: ManagedProcess, name: str, cli_dir: str):
             try:
+                # client2 still holds the baseline copy; time a fresh write
+                reset_download(cli_dir, "medium.bin")
                 t, s = fetch_and_measure(cli, "medium.bin", timeout=600.0)
                 with lock:
                     times[name] = t
@@ -316,9 +497,9 @@ def test2_peer_concurrency(base_port: int = 8000) -> List[TestResult]:
                 print(f"  {name} failed: {e}")
 
         threads = [
-            threading.Thread(target=worker, args=(c2, "client2"), daemon=True),
-            threading.Thread(target=worker, args=(c3, "client3"), daemon=True),
-            threading.Thread(target=worker, args=(c4, "client4"), daemon=True),
+            threading.Thread(target=worker, args=(c2, "client2", client2_dir), daemon=True),
+            threading.Thread(target=worker, args=(c3, "client3", client3_dir), daemon=True),
+            threading.Thread(target=worker, args=(c4, "client4", client4_dir), daemon=True),
         ]
         for t in threads:
             t.start()
@@ -361,33 +542,62 @@ def test3_server_load(base_port: int = 8000, clients_n: int = 10) -> List[TestRe
     srv = start_server(base_port)
     clients: List[ManagedProcess] = []
     try:
-        # Start N clients nearly simultaneously
+        # Start N clients simultaneously; each start blocks on its own registration
         base_p2p = 9101
-        for i in range(clients_n):
+
+        def launch(i: int) -> ManagedProcess:
             name = f"load{i+1}"
             shared = os.path.join(ROOT, "shared_files", name)
             ensure_dir(shared)
-            cli = start_client(name, "localhost", base_port, base_p2p + i, shared)
-            clients.append(cli)
+            return start_client(name, "localhost", base_port, base_p2p + i, shared)
+
+        with ThreadPoolExecutor(max_workers=clients_n) as pool:
+            futures = [pool.submit(launch, i) for i in range(clients_n)]
+        start_errors = []
+        for fut in futures:
+            try:
+                clients.append(fut.result())
+            except Exception as e:
+                start_errors.append(e)
+        if start_errors:
+            raise start_errors[0]
 
         # Prepare 5 tiny files per client and publish simultaneously
         print("Publishing 5 small files per client...")
+        publish_errors: List[Exception] = []
+
+        def publish_all(cli: ManagedProcess, fnames: List[str]):
+            try:
+                for fname in fnames:
+                    # File created inside its shared folder; use basename only for publish
+                    publish(cli, fname, fname)
+            except Exception as e:
+                publish_errors.append(e)
+
+        publishers = []
         for idx, cli in enumerate(clients):
             name = f"load{idx+1}"
             shared = os.path.join(ROOT, "shared_files", name)
-            for k in range(5):
-                fname = f"{name}_f{k+1}.txt"
+            fnames = [f"{name}_f{k+1}.txt" for k in range(5)]
+            for k, fname in enumerate(fnames):
                 fpath = os.path.join(shared, fname)
                 with open(fpath, "w", encoding="utf-8") as f:
                     f.write(f"file {k+1} from {name} - {random_string(16)}\n")
-                # File created inside its shared folder; use basename only for publish
-                publish(cli, fname, fname)
+            # Each client publishes its own files; clients run side by side
+            publishers.append(threading.Thread(target=publish_all, args=(cli, fnames), daemon=True))
+        for t in publishers:
+            t.start()
+        for t in publishers:
+            t.join()
+        if publish_errors:
+            raise publish_errors[0]
 
         # Each client fetches 5 files from the next client in ring
         print("Issuing 5 fetches per client...")
-        errors = 0
+        # One slot per thread: each worker only writes its own count
+        err_counts = [0] * len(clients)
+
         def fetch_ring(i: int):
-            nonlocal errors
             me = clients[i]
             target = (i + 1) % len(clients)
             target_name = f"load{target+1}"
@@ -395,8 +605,9 @@ def test3_server_load(base_port: int = 8000, clients_n: int = 10) -> List[TestRe
                 fname = f"{target_name}_f{k+1}.txt"
                 try:
                     t, s = fetch_and_measure(me, fname, timeout=120.0)
-                except Exception as e:
-                    errors += 1
+                except Exception:
+                    err_counts[i] += 1
+
         threads = [threading.Thread(target=fetch_ring, args=(i,), daemon=True) for i in range(len(clients))]
         t0 = now_monotonic()
         for t in threads:
@@ -405,6 +616,7 @@ def test3_server_load(base_port: int = 8000, clients_n: int = 10) -> List[TestRe
             t.join()
         t1 = now_monotonic()
         dur = t1 - t0
+        errors = sum(err_counts)
         print(f"Completed {clients_n * 5} fetch operations across {clients_n} clients in {dur:.2f}s, errors={errors}")
         results.append(TestResult(
             name="Test3-server-load",
@@ -444,10 +656,16 @@ def main():
 
     results: List[TestResult] = []
     try:
+        baseline: Optional[float] = None
         if run_t1:
-            results.extend(test1_file_transfer_speed(base_port=base_port))
+            t1_results = test1_file_transfer_speed(base_port=base_port)
+            results.extend(t1_results)
+            # Test 1 already timed medium.bin on client2 alone; reuse it
+            for r in t1_results:
+                if r.name == "Test1-medium.bin":
+                    baseline = float(r.details["time_s"])
         if run_t2:
-            results.extend(test2_peer_concurrency(base_port=base_port))
+            results.extend(test2_peer_concurrency(base_port=base_port, baseline_override=baseline))
         if run_t3:
             results.extend(test3_server_load(base_port=base_port, clients_n=10))
     finally:
@@ -1,3 +1,12 @@
+import re
+from collections import namedtuple
+
+
+# One entry of a FETCH_OK / LOOKUP_BATCH_OK peer list
+Peer = namedtuple("Peer", "ip port hostname")
+_PEER_RE = re.compile(r"(\S+?):(\d+):(\S+)")
+
+
 class Protocol:    
     # Client-Server Protocol Messages
     REGISTER = "REGISTER"
@@ -8,10 +17,16 @@ class Protocol:
     PUBLISH_SUCCESS = "PUBLISH_SUCCESS"
     PUBLISH_FAIL = "PUBLISH_FAIL"
     
+    PUBLISH_BULK = "PUBLISH_BULK"
+    PUBLISH_BULK_OK = "PUBLISH_BULK_OK"
+    
     FETCH = "FETCH"
     FETCH_OK = "FETCH_OK"
     FETCH_NOT_FOUND = "FETCH_NOT_FOUND"
     
+    LOOKUP_BATCH = "LOOKUP_BATCH"
+    LOOKUP_BATCH_OK = "LOOKUP_BATCH_OK"
+    
     LIST_CLIENTS = "LIST_CLIENTS"
     LIST_CLIENTS_OK = "LIST_CLIENTS_OK"
     
@@ -31,56 +46,69 @@ class Protocol:
     LIST = "LIST"
     FILES = "FILES"
     QUIT = "QUIT"
+    
+    # Pre-encoded prefixes for the message builders below
+    REGISTER_B = b"REGISTER "
+    PUBLISH_B = b"PUBLISH "
+    PUBLISH_BULK_B = b"PUBLISH_BULK "
+    FETCH_B = b"FETCH "
+    LOOKUP_BATCH_B = b"LOOKUP_BATCH "
+    LIST_CLIENTS_B = b"LIST_CLIENTS"
+    DISCOVER_CLIENT_B = b"DISCOVER_CLIENT "
+    DOWNLOAD_B = b"DOWNLOAD "
+    FILESIZE_B = b"FILESIZE "
 
 
-class ProtocolHelper:    
+class ProtocolHelper:
+    # Messages are built as UTF-8 bytes, ready for the socket without the
+    # newline terminator; _send_msg in client.py accepts them as-is.
     @staticmethod
     def create_register_message(hostname, p2p_port):
-        return f"{Protocol.REGISTER} {hostname} {p2p_port}"
+        return b"%s%s %d" % (Protocol.REGISTER_B, hostname.encode(), p2p_port)
     
     @staticmethod
     def create_publish_message(filename, hostname):
-        return f"{Protocol.PUBLISH} {filename} {hostname}"
+        return b"%s%s %s" % (Protocol.PUBLISH_B, filename.encode(), hostname.encode())
+    
+    @staticmethod
+    def create_publish_bulk_message(filenames, hostname):
+        head = b"%s%s %d" % (Protocol.PUBLISH_BULK_B, hostname.encode(), len(filenames))
+        return b"\n".join([head, *(f.encode() for f in filenames)])
     
     @staticmethod
     def create_fetch_message(filename):
-        return f"{Protocol.FETCH} {filename}"
+        return Protocol.FETCH_B + filename.encode()
+    
+    @staticmethod
+    def create_lookup_batch_message(filenames):
+        head = b"%s%d" % (Protocol.LOOKUP_BATCH_B, len(filenames))
+        return b"\n".join([head, *(f.encode() for f in filenames)])
     
     @staticmethod
     def create_list_clients_message():
-        return f"{Protocol.LIST_CLIENTS}"
+        return Protocol.LIST_CLIENTS_B
     
     @staticmethod
     def create_discover_client_message(hostname):
-        return f"{Protocol.DISCOVER_CLIENT} {hostname}"
+        return Protocol.DISCOVER_CLIENT_B + hostname.encode()
     
     @staticmethod
     def create_download_message(filename):
-        return f"{Protocol.DOWNLOAD} {filename}"
+        return Protocol.DOWNLOAD_B + filename.encode()
     
     @staticmethod
     def create_filesize_message(size):
-        return f"{Protocol.FILESIZE} {size}"
+        return b"%s%d" % (Protocol.FILESIZE_B, size)
     
     @staticmethod
     def parse_message(message):
-        parts = message.strip().split()
-        if not parts:
+        # Split off the verb only; the rest is tokenised just once. Works on
+        # str or bytes.
+        verb, _, rest = message.strip().partition(b" " if isinstance(message, bytes) else " ")
+        if not verb:
             return None, []
-        return parts[0], parts[1:]
+        return verb, rest.split() if rest else []
     
     @staticmethod
     def parse_peer_list(peer_list_str):
-        peers = []
-        parts = peer_list_str.split()
-        
-        for peer_info in parts:
-            peer_parts = peer_info.split(':')
-            if len(peer_parts) >= 3:
-                peers.append({
-                    'ip': peer_parts[0],
-                    'port': int(peer_parts[1]),
-                    'hostname': peer_parts[2]
-                })
-        
-        return peers
+        return [Peer(m[1], int(m[2]), m[3]) for m in _PEER_RE.finditer(peer_list_str)]
@@ -1,266 +1,617 @@
+import os
+import time
 import socket
+import selectors
 import threading
 import sys
-from datetime import datetime
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+# Fixed replies, encoded once; handlers return complete newline-terminated bytes
+RESP_REGISTER_OK = b"REGISTER_SUCCESS\n"
+RESP_REGISTER_TAKEN = b"REGISTER_FAIL Hostname already exists\n"
+RESP_PUBLISH_OK = b"PUBLISH_SUCCESS\n"
+RESP_PUBLISH_UNREGISTERED = b"PUBLISH_FAIL Client not registered\n"
+RESP_PUBLISH_BAD_NAME = b"PUBLISH_FAIL Filename must not contain whitespace\n"
+RESP_FETCH_MISS = b"FETCH_NOT_FOUND\n"
+RESP_LIST_EMPTY = b"LIST_CLIENTS_OK\n"
+RESP_DISCOVER_EMPTY = b"DISCOVER_CLIENT_OK\n"
+RESP_DISCOVER_MISS = b"DISCOVER_CLIENT_NOT_FOUND\n"
+RESP_UNKNOWN = b"UNKNOWN_COMMAND\n"
+
+logger = logging.getLogger("server")
+
+
+class _ConsoleFormatter(logging.Formatter):
+    """'[HH:MM:SS] message'; records logged with extra={'plain': True} go out bare"""
+    def __init__(self):
+        super().__init__("[%(asctime)s] %(message)s", datefmt="%H:%M:%S")
+        self._ts_cache = (None, "")  # (epoch second, formatted)
+    
+    def formatTime(self, record, datefmt=None):
+        # Records arrive in bursts within the same second; strftime once per second
+        second = int(record.created)
+        cached = self._ts_cache
+        if cached[0] != second:
+            cached = (second, time.strftime(self.datefmt, time.localtime(second)))
+            self._ts_cache = cached
+        return cached[1]
+    
+    def format(self, record):
+        if getattr(record, 'plain', False):
+            return record.getMessage()
+        return super().format(record)
+
+
+class _FdHandler(logging.Handler):
+    """Write each formatted record to a raw fd with os.write, bypassing the
+    buffered sys.stdout writer and its lock"""
+    def __init__(self, fd):
+        super().__init__()
+        self.fd = fd
+    
+    def emit(self, record):
+        try:
+            data = (self.format(record) + "\n").encode('utf-8')
+            if self.fd == sys.stdout.fileno():
+                # Keep ordering with the admin commands' print() output
+                sys.stdout.flush()
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self.fd, view):]
+        except Exception:
+            self.handleError(record)
+
+
+def start_log_listener(log_path=None):
+    """Queue server log records; a background thread formats and writes them.
+
+    Request handling only builds a record and enqueues it, so timestamp
+    formatting and the write syscall stay off the selector loop. Records go
+    to stdout, or appended to log_path (O_APPEND) when given. Returns the
+    listener, the QueueHandler added to `logger` and the fd to close, if
+    one was opened; the caller removes the handler when it stops.
+    """
+    log_queue = queue.SimpleQueue()
+    if log_path:
+        log_fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    else:
+        log_fd = None
+    handler = _FdHandler(sys.stdout.fileno() if log_fd is None else log_fd)
+    handler.setFormatter(_ConsoleFormatter())
+    listener = QueueListener(log_queue, handler)
+    queue_handler = QueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener.start()
+    return listener, queue_handler, log_fd
+
 
 class CentralServer:
-    def __init__(self, port):
+    RECV_SIZE = 64 * 1024  # read as much as a burst of commands will fill
+    LISTEN_BACKLOG = 128   # connects queued in the kernel while the loop is busy
+    # Keepalive probing: idle seconds before the first probe, seconds
+    # between probes, and unanswered probes before the peer is dropped
+    KEEPALIVE_IDLE = 30
+    KEEPALIVE_INTERVAL = 10
+    KEEPALIVE_COUNT = 3
+    # Input limits; a client exceeding them is disconnected instead of
+    # growing its read buffer without bound
+    MAX_LINE = 4096        # longest command or filename line, in bytes
+    MAX_BATCH = 10000      # most filenames in one PUBLISH_BULK / LOOKUP_BATCH
+    
+    def __init__(self, port, socket_buffer_size=1024 * 1024, log_path=None):
         self.port = port
-        self.clients = {}  # {hostname: {'ip': '...', 'port': ..., 'socket': ..., 'active': True}}
-        self.files = {}    # {filename: [hostname1, hostname2, ...]}
-        self.lock = threading.Lock()  # Thread-safe access to shared data
+        # SO_RCVBUF/SO_SNDBUF for client connections; 0 leaves the kernel's
+        # autotuning alone
+        self.socket_buffer_size = socket_buffer_size
+        # Append server logs to this file instead of stdout
+        self.log_path = log_path
+        # Registered clients, one slot per client id assigned at REGISTER
+        # (parallel lists, so the FETCH loop indexes instead of hashing)
+        self.host_to_id = {}            # {hostname: id}
+        self.client_host = []           # id -> hostname
+        self.client_ip = []             # id -> ip
+        self.client_port = []           # id -> p2p port
+        self.client_addr = []           # id -> 'ip:port:hostname' peer-list entry
+        self.client_socket = []         # id -> control socket
+        self.client_active = bytearray()  # id -> 1 while connected
+        # Holder "sets" are dicts with None values: O(1) membership, and
+        # FETCH/DISCOVER list entries in publish order
+        self.files = {}    # {filename: {client id: None, ...}}
+        self.files_by_host = {}  # {hostname: {filename: None, ...}}, the reverse index
+        # Bumped on every registry change; cached replies built at an older
+        # version are rebuilt on next use
+        self.topology_version = 0
+        # LIST_CLIENTS reply, rebuilt only when a client registers or
+        # disconnects (publishes don't change it)
+        self._list_reply = RESP_LIST_EMPTY
+        self._fetch_cache = {}  # {filename: (version, reply)}
+        # Shared with the admin command thread when stdin can't join the selector
+        self.lock = threading.Lock()
         self.server_socket = None
+        self.selector = None
+        # One receive buffer for the whole loop; only one socket is read at a time
+        self._recv_buf = bytearray(self.RECV_SIZE)
+        self._recv_view = memoryview(self._recv_buf)
+        # Command word -> wire handler, one dict lookup per command
+        self._dispatch = {
+            b"REGISTER": self._wire_register,
+            b"PUBLISH": self._wire_publish,
+            b"PUBLISH_BULK": self._wire_publish_bulk,
+            b"FETCH": self._wire_fetch,
+            b"LOOKUP_BATCH": self._wire_lookup_batch,
+            b"LIST_CLIENTS": self._wire_list,
+            b"DISCOVER_CLIENT": self._wire_discover,
+        }
+        self._running = False
+        self._stdin_buf = bytearray()
         
     def start(self):
+        log_listener, log_handler, log_fd = start_log_listener(self.log_path)
         try:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.socket_buffer_size:
+                # Set on the listener so accepted sockets inherit the sizes
+                # (and the window scale) without a setsockopt per accept
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.socket_buffer_size)
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.socket_buffer_size)
             self.server_socket.bind(('', self.port))
-            self.server_socket.listen(10)
+            self.server_socket.listen(self.LISTEN_BACKLOG)
+            self.server_socket.setblocking(False)
             
-            print(f"[{self.get_timestamp()}] Central Server started on port {self.port}")
-            print(f"[{self.get_timestamp()}] Waiting for client connections...")
-            print("\nAvailable server commands:")
-            print("  - discover <hostname>  : List files shared by a client")
-            print("  - ping <hostname>      : Check if a client is active")
-            print("  - list                 : List all connected clients")
-            print("  - files                : List all available files")
-            print("  - quit                 : Shutdown the server\n")
+            # Every connection is served from one selector loop (epoll on
+            # Linux, kqueue on BSD/macOS) instead of a thread per client
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.server_socket, selectors.EVENT_READ, None)
             
-            command_thread = threading.Thread(target=self.server_command_interface, daemon=True)
-            command_thread.start()
+            logger.info("Central Server started on port %d", self.port)
+            logger.info("Waiting for client connections...")
+            # Through the logger too, so it stays after the lines above
+            logger.info("\nAvailable server commands:\n"
+                        "  - discover <hostname>  : List files shared by a client\n"
+                        "  - ping <hostname>      : Check if a client is active\n"
+                        "  - list                 : List all connected clients\n"
+                        "  - files                : List all available files\n"
+                        "  - quit                 : Shutdown the server\n", extra={'plain': True})
             
-            # Accept client connections
-            while True:
-                try:
-                    client_socket, client_address = self.server_socket.accept()
-                    print(f"[{self.get_timestamp()}] New connection from {client_address}")
-                    
-                    # Handle each client in a separate thread
-                    client_thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket, client_address),
-                        daemon=True
-                    )
-                    client_thread.start()
-                    
-                except Exception as e:
-                    print(f"[{self.get_timestamp()}] Error accepting connection: {e}")
+            stdin_fd = self._register_stdin()
+            timeout = None
+            if stdin_fd is None:
+                command_thread = threading.Thread(target=self.server_command_interface, daemon=True)
+                command_thread.start()
+                # Wake up now and then to notice a quit from the thread
+                timeout = 1.0
+            
+            self._running = True
+            while self._running:
+                for key, mask in self.selector.select(timeout):
+                    if key.data is None:
+                        self.accept_client()
+                    elif key.fileobj == stdin_fd:
+                        self.read_stdin(stdin_fd)
+                    else:
+                        self.service_client(key.data, mask)
                     
         except Exception as e:
-            print(f"[{self.get_timestamp()}] Server error: {e}")
+            logger.error("Server error: %s", e)
         finally:
             if self.server_socket:
                 self.server_socket.close()
+            # Detach first, so a later start() in this process doesn't log twice
+            logger.removeHandler(log_handler)
+            log_listener.stop()
+            if log_fd is not None:
+                os.close(log_fd)
     
-    def handle_client(self, client_socket, client_address):
-        hostname = None
+    def accept_client(self):
+        # Drain the whole accept queue per wakeup so a burst of connects costs
+        # one select() instead of one per client
+        while True:
+            try:
+                client_socket, client_address = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except Exception as e:
+                logger.error("Error accepting connection: %s", e)
+                return
+            logger.info("New connection from %s", client_address)
+            client_socket.setblocking(False)
+            # Commands and replies are tiny; don't let Nagle hold them back
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if hasattr(socket, 'TCP_QUICKACK'):
+                # Linux only, and the kernel drops back to delayed ACKs on its
+                # own; this covers the REGISTER/PUBLISH burst right after connect
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+            # Let the kernel notice peers that vanished without a FIN
+            client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                # The default idle time is two hours; a dead peer would keep
+                # showing up in FETCH replies that long. A failed probe makes
+                # recv() error out and the client is marked inactive.
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.KEEPALIVE_IDLE)
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, self.KEEPALIVE_INTERVAL)
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, self.KEEPALIVE_COUNT)
+            self.add_connection(client_socket, client_address)
+    
+    def add_connection(self, client_socket, client_address):
+        # Per-connection state: unparsed input, unsent output, and the
+        # hostname this connection last spoke for
+        conn = {
+            'socket': client_socket,
+            'address': client_address,
+            'rbuf': bytearray(),
+            'wbuf': bytearray(),
+            'hostname': None,
+            'events': selectors.EVENT_READ,
+            # newlines still needed before the buffered input can make progress
+            'need': 1,
+            # bytes received since the last newline
+            'tail': 0,
+        }
+        self.selector.register(client_socket, selectors.EVENT_READ, conn)
+    
+    def service_client(self, conn, mask):
         try:
+            if mask & selectors.EVENT_READ:
+                try:
+                    n = conn['socket'].recv_into(self._recv_buf)
+                except (BlockingIOError, InterruptedError):
+                    n = None
+                if n == 0:
+                    self.close_client(conn)
+                    return
+                if n:
+                    nl = self._recv_buf.rfind(b"\n", 0, n)
+                    conn['tail'] = conn['tail'] + n if nl < 0 else n - nl - 1
+                    if conn['tail'] > self.MAX_LINE:
+                        raise ValueError(f"line longer than {self.MAX_LINE} bytes")
+                    conn['rbuf'] += self._recv_view[:n]
+                    # Don't rescan a partial command until enough lines arrived
+                    conn['need'] -= self._recv_buf.count(b"\n", 0, n)
+                    if conn['need'] <= 0:
+                        self.process_commands(conn)
+            self.flush_client(conn)
+        except Exception as e:
+            logger.error("Error handling client %s: %s", conn['hostname'], e)
+            self.close_client(conn)
+    
+    def process_commands(self, conn):
+        """Run every complete command in the read buffer, queueing the replies.
+
+        The whole batch runs under one registry lock acquisition; the
+        handle_* methods called from the wire handlers assume it is held.
+        """
+        buf = conn['rbuf']
+        pos = 0
+        conn['need'] = 1
+        with self.lock:
             while True:
-                data = client_socket.recv(4096).decode('utf-8').strip()
-                if not data:
+                nl = buf.find(b"\n", pos)
+                if nl < 0:
                     break
-                
-                print(f"[{self.get_timestamp()}] Received: {data}")
-                
-                parts = data.split()
-                command = parts[0]
-                
-                if command == "REGISTER":
-                    hostname = parts[1]
-                    p2p_port = int(parts[2])
-                    response = self.handle_register(hostname, client_address[0], p2p_port, client_socket)
-                    
-                elif command == "PUBLISH":
-                    filename = parts[1]
-                    hostname = parts[2]
-                    response = self.handle_publish(filename, hostname)
-                    
-                elif command == "FETCH":
-                    filename = parts[1]
-                    response = self.handle_fetch(filename)
-                    
-                elif command == "LIST_CLIENTS":
-                    response = self.handle_list_clients()
-                    
-                elif command == "DISCOVER_CLIENT":
-                    if len(parts) < 2:
-                        response = "DISCOVER_CLIENT_NOT_FOUND"
+                # Commands stay bytes; the wire handlers decode only the fields they use
+                data = bytes(buf[pos:nl]).strip()
+                end = nl + 1
+                body = []
+                if data:
+                    parts = data.split(b' ', 2)
+                    # PUBLISH_BULK / LOOKUP_BATCH carry their filenames on the
+                    # following lines; wait until all of them have arrived
+                    if parts[0] == b"PUBLISH_BULK":
+                        count = int(parts[2])
+                    elif parts[0] == b"LOOKUP_BATCH":
+                        count = int(parts[1])
                     else:
-                        client_hostname = parts[1]
-                        response = self.handle_discover_client(client_hostname)
-                    
-                else:
-                    response = "UNKNOWN_COMMAND"
-                
-                client_socket.send(response.encode('utf-8'))
-                print(f"[{self.get_timestamp()}] Sent: {response}")
+                        count = 0
+                    if not 0 <= count <= self.MAX_BATCH:
+                        raise ValueError(f"batch of {count} names (limit {self.MAX_BATCH})")
+                    while len(body) < count:
+                        nl = buf.find(b"\n", end)
+                        if nl < 0:
+                            break
+                        body.append(buf[end:nl].decode('utf-8').strip())
+                        end = nl + 1
+                    if len(body) < count:
+                        conn['need'] = count - len(body)
+                        break
+                pos = end
+                if not data:
+                    continue
                 
-        except Exception as e:
-            print(f"[{self.get_timestamp()}] Error handling client {hostname}: {e}")
-        finally:
-            if hostname:
-                self.handle_disconnect(hostname)
-            client_socket.close()
+                logger.info("Received: %s", data.decode('utf-8', 'replace'))
+                handler = self._dispatch.get(parts[0])
+                response = handler(conn, data, parts, body) if handler else RESP_UNKNOWN
+                conn['wbuf'] += response
+                logger.info("Sent: %s", response.decode('utf-8').rstrip())
+        del buf[:pos]
+    
+    # Wire handlers: (conn, data, parts, body) -> reply bytes, where data is
+    # the command line and parts is data.split(b' ', 2)
+    
+    def _wire_register(self, conn, data, parts, body):
+        conn['hostname'] = parts[1].decode('utf-8')
+        p2p_port = int(parts[2])
+        return self.handle_register(conn['hostname'], conn['address'][0], p2p_port, conn['socket'])
+    
+    def _wire_publish(self, conn, data, parts, body):
+        # DISCOVER_CLIENT replies and peer DOWNLOAD requests are
+        # space-separated, so a filename with whitespace can't be served
+        if len(parts) != 3 or len(parts[2].split()) != 1:
+            return RESP_PUBLISH_BAD_NAME
+        conn['hostname'] = parts[2].decode('utf-8')
+        return self.handle_publish(parts[1].decode('utf-8'), conn['hostname'])
+    
+    def _wire_publish_bulk(self, conn, data, parts, body):
+        conn['hostname'] = parts[1].decode('utf-8')
+        return self.handle_publish_bulk(body, conn['hostname'])
+    
+    def _wire_fetch(self, conn, data, parts, body):
+        return self.handle_fetch(data[len(b"FETCH "):].decode('utf-8'))
+    
+    def _wire_lookup_batch(self, conn, data, parts, body):
+        return self.handle_lookup_batch(body)
+    
+    def _wire_list(self, conn, data, parts, body):
+        return self.handle_list_clients()
+    
+    def _wire_discover(self, conn, data, parts, body):
+        if len(parts) < 2:
+            return RESP_DISCOVER_MISS
+        return self.handle_discover_client(data[len(b"DISCOVER_CLIENT "):].decode('utf-8'))
+    
+    def flush_client(self, conn):
+        """Send what the socket will take now; wait for writability for the rest"""
+        wbuf = conn['wbuf']
+        if wbuf:
+            try:
+                sent = conn['socket'].send(wbuf)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            del wbuf[:sent]
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if wbuf else 0)
+        if events != conn['events']:
+            self.selector.modify(conn['socket'], events, conn)
+            conn['events'] = events
+    
+    def close_client(self, conn):
+        try:
+            self.selector.unregister(conn['socket'])
+        except (KeyError, ValueError):
+            pass
+        conn['socket'].close()
+        if conn['hostname']:
+            self.handle_disconnect(conn['hostname'])
     
     def handle_register(self, hostname, ip, port, client_socket):
-        with self.lock:
-            if hostname in self.clients:
-                return "REGISTER_FAIL Hostname already exists"
-            
-            self.clients[hostname] = {
-                'ip': ip,
-                'port': port,
-                'socket': client_socket,
-                'active': True
-            }
-            
-        print(f"[{self.get_timestamp()}] Client '{hostname}' registered at {ip}:{port}")
-        return "REGISTER_SUCCESS"
+        if hostname in self.host_to_id:
+            return RESP_REGISTER_TAKEN
+        
+        self.host_to_id[hostname] = len(self.client_host)
+        self.client_host.append(hostname)
+        self.client_ip.append(ip)
+        self.client_port.append(port)
+        # Peer-list entry, built once instead of on every FETCH
+        self.client_addr.append(f"{ip}:{port}:{hostname}")
+        self.client_socket.append(client_socket)
+        self.client_active.append(1)
+        self.topology_version += 1
+        self._rebuild_list_reply()
+        
+        logger.info("Client '%s' registered at %s:%d", hostname, ip, port)
+        return RESP_REGISTER_OK
     
     def handle_publish(self, filename, hostname):
-        with self.lock:
-            if hostname not in self.clients:
-                return "PUBLISH_FAIL Client not registered"
-            
-            if filename not in self.files:
-                self.files[filename] = []
-            
-            if hostname not in self.files[filename]:
-                self.files[filename].append(hostname)
-            
-        print(f"[{self.get_timestamp()}] File '{filename}' published by '{hostname}'")
-        return "PUBLISH_SUCCESS"
+        cid = self.host_to_id.get(hostname)
+        if cid is None:
+            return RESP_PUBLISH_UNREGISTERED
+        
+        self.files.setdefault(filename, {})[cid] = None
+        self.files_by_host.setdefault(hostname, {})[filename] = None
+        self.topology_version += 1
+        
+        logger.info("File '%s' published by '%s'", filename, hostname)
+        return RESP_PUBLISH_OK
+    
+    def handle_publish_bulk(self, filenames, hostname):
+        """Publish many files for one client in a single command"""
+        published = 0
+        cid = self.host_to_id.get(hostname)
+        if cid is None:
+            return RESP_PUBLISH_UNREGISTERED
+        
+        shared = self.files_by_host.setdefault(hostname, {})
+        
+        for filename in filenames:
+            # Skip blank lines and names with whitespace (see _wire_publish)
+            if len(filename.split()) != 1:
+                continue
+            self.files.setdefault(filename, {})[cid] = None
+            shared[filename] = None
+            published += 1
+        self.topology_version += 1
+        
+        logger.info("%d file(s) published by '%s'", published, hostname)
+        return b"PUBLISH_BULK_OK %d\n" % published
     
     def handle_fetch(self, filename):
-        with self.lock:
-            if filename not in self.files or len(self.files[filename]) == 0:
-                return "FETCH_NOT_FOUND"
-            
-            # Build list of peers with the file
-            peers = []
-            for hostname in self.files[filename]:
-                if hostname in self.clients and self.clients[hostname]['active']:
-                    client = self.clients[hostname]
-                    peers.append(f"{client['ip']}:{client['port']}:{hostname}")
-            
-            if not peers:
-                return "FETCH_NOT_FOUND"
-            
-            return "FETCH_OK " + " ".join(peers)
+        if filename not in self.files:
+            return RESP_FETCH_MISS
+        cached = self._fetch_cache.get(filename)
+        if cached and cached[0] == self.topology_version:
+            return cached[1]
+        
+        peers = self._active_peers(filename)
+        if peers:
+            response = f"FETCH_OK {' '.join(peers)}\n".encode('utf-8')
+        else:
+            response = RESP_FETCH_MISS
+        self._fetch_cache[filename] = (self.topology_version, response)
+        return response
+    
+    def handle_lookup_batch(self, filenames):
+        """Answer many FETCH lookups at once: one "<peers...>" line per requested
+        filename, in request order (empty when nobody has it)"""
+        lines = [" ".join(self._active_peers(filename)) for filename in filenames]
+        return "\n".join([f"LOOKUP_BATCH_OK {len(lines)}", *lines, ""]).encode('utf-8')
+    
+    def _active_peers(self, filename):
+        """ip:port:hostname for every active holder of filename; caller holds the lock"""
+        active, addr = self.client_active, self.client_addr
+        return [addr[cid] for cid in self.files.get(filename, ()) if active[cid]]
     
     def handle_disconnect(self, hostname):
         with self.lock:
-            if hostname in self.clients:
-                self.clients[hostname]['active'] = False
-                print(f"[{self.get_timestamp()}] Client '{hostname}' disconnected")
+            cid = self.host_to_id.get(hostname)
+            if cid is not None:
+                self.client_active[cid] = 0
+                self.topology_version += 1
+                self._rebuild_list_reply()
+                logger.info("Client '%s' disconnected", hostname)
     
     def handle_list_clients(self):
         """Return list of all active clients"""
-        with self.lock:
-            active_clients = []
-            for hostname, info in self.clients.items():
-                if info['active']:
-                    active_clients.append(hostname)
-            
-            if not active_clients:
-                return "LIST_CLIENTS_OK"
-            
-            return "LIST_CLIENTS_OK " + " ".join(active_clients)
+        return self._list_reply
+    
+    def _rebuild_list_reply(self):
+        active_clients = [h for h, a in zip(self.client_host, self.client_active) if a]
+        if active_clients:
+            self._list_reply = f"LIST_CLIENTS_OK {' '.join(active_clients)}\n".encode('utf-8')
+        else:
+            self._list_reply = RESP_LIST_EMPTY
     
     def handle_discover_client(self, client_hostname):
         """Return list of files shared by a specific client"""
-        with self.lock:
-            if client_hostname not in self.clients:
-                return "DISCOVER_CLIENT_NOT_FOUND"
-            
-            files = []
-            for filename, hosts in self.files.items():
-                if client_hostname in hosts:
-                    files.append(filename)
-            
-            if not files:
-                return "DISCOVER_CLIENT_OK"
-            
-            return "DISCOVER_CLIENT_OK " + " ".join(files)
+        if client_hostname not in self.host_to_id:
+            return RESP_DISCOVER_MISS
+        
+        files = self.files_by_host.get(client_hostname, ())
+        if not files:
+            return RESP_DISCOVER_EMPTY
+        
+        return f"DISCOVER_CLIENT_OK {' '.join(files)}\n".encode('utf-8')
+    
+    def _register_stdin(self):
+        """Serve admin commands from the selector loop; returns stdin's fd,
+        or None when stdin can't be polled (Windows, regular files)"""
+        if os.name != 'posix':
+            return None
+        try:
+            fd = sys.stdin.fileno()
+            self.selector.register(fd, selectors.EVENT_READ, 'stdin')
+        except (AttributeError, ValueError, OSError):
+            return None
+        return fd
+    
+    def read_stdin(self, fd):
+        data = os.read(fd, 4096)
+        if not data:
+            # Console closed; keep serving clients
+            self.selector.unregister(fd)
+            return
+        buf = self._stdin_buf
+        buf += data
+        pos = 0
+        while self._running:
+            nl = buf.find(b"\n", pos)
+            if nl < 0:
+                break
+            self.handle_admin_command(buf[pos:nl].decode('utf-8', 'replace'))
+            pos = nl + 1
+        del buf[:pos]
+        sys.stdout.flush()
     
     def server_command_interface(self):
+        """Blocking console loop, for platforms where stdin can't be selected"""
         while True:
             try:
-                command = input().strip()
-                if not command:
-                    continue
+                command = input()
+            except EOFError:
+                return
+            if not self.handle_admin_command(command):
+                return
+    
+    def handle_admin_command(self, command):
+        """Run one console command; returns False on quit"""
+        try:
+            command = command.strip()
+            if not command:
+                return True
+            
+            parts = command.split()
+            cmd = parts[0].lower()
+            
+            if cmd == "discover":
+                if len(parts) < 2:
+                    print("Usage: discover <hostname>")
+                    return True
+                hostname = parts[1]
+                self.discover_files(hostname)
                 
-                parts = command.split()
-                cmd = parts[0].lower()
+            elif cmd == "ping":
+                if len(parts) < 2:
+                    print("Usage: ping <hostname>")
+                    return True
+                hostname = parts[1]
+                self.ping_client(hostname)
                 
-                if cmd == "discover":
-                    if len(parts) < 2:
-                        print("Usage: discover <hostname>")
-                        continue
-                    hostname = parts[1]
-                    self.discover_files(hostname)
-                    
-                elif cmd == "ping":
-                    if len(parts) < 2:
-                        print("Usage: ping <hostname>")
-                        continue
-                    hostname = parts[1]
-                    self.ping_client(hostname)
-                    
-                elif cmd == "list":
-                    self.list_clients()
-                    
-                elif cmd == "files":
-                    self.list_files()
-                    
-                elif cmd == "quit":
-                    print(f"[{self.get_timestamp()}] Shutting down server...")
-                    sys.exit(0)
-                    
-                else:
-                    print(f"Unknown command: {cmd}")
-                    
-            except Exception as e:
-                print(f"Error processing command: {e}")
+            elif cmd == "list":
+                self.list_clients()
+                
+            elif cmd == "files":
+                self.list_files()
+                
+            elif cmd == "quit":
+                logger.info("Shutting down server...")
+                self._running = False
+                return False
+                
+            else:
+                print(f"Unknown command: {cmd}")
+                
+        except Exception as e:
+            print(f"Error processing command: {e}")
+        return True
     
     def discover_files(self, hostname):
         with self.lock:
-            if hostname not in self.clients:
+            if hostname not in self.host_to_id:
                 print(f"Client '{hostname}' not found")
                 return
             
             print(f"\nFiles shared by '{hostname}':")
-            found = False
-            for filename, hosts in self.files.items():
-                if hostname in hosts:
-                    print(f"  - {filename}")
-                    found = True
+            files = self.files_by_host.get(hostname, ())
+            for filename in files:
+                print(f"  - {filename}")
             
-            if not found:
+            if not files:
                 print("  (no files)")
             print()
     
     def ping_client(self, hostname):
         with self.lock:
-            if hostname not in self.clients:
+            cid = self.host_to_id.get(hostname)
+            if cid is None:
                 print(f"Client '{hostname}' not found")
                 return
             
-            status = "ACTIVE" if self.clients[hostname]['active'] else "INACTIVE"
-            ip = self.clients[hostname]['ip']
-            port = self.clients[hostname]['port']
+            status = "ACTIVE" if self.client_active[cid] else "INACTIVE"
+            ip = self.client_ip[cid]
+            port = self.client_port[cid]
             print(f"Client '{hostname}' at {ip}:{port} is {status}")
     
     def list_clients(self):
         with self.lock:
             print("\nRegistered Clients:")
-            if not self.clients:
+            if not self.client_host:
                 print("  (none)")
             else:
-                for hostname, info in self.clients.items():
-                    status = "ACTIVE" if info['active'] else "INACTIVE"
-                    print(f"  - {hostname} ({info['ip']}:{info['port']}) - {status}")
+                for cid, hostname in enumerate(self.client_host):
+                    status = "ACTIVE" if self.client_active[cid] else "INACTIVE"
+                    print(f"  - {hostname} ({self.client_ip[cid]}:{self.client_port[cid]}) - {status}")
             print()
     
     def list_files(self):
@@ -269,14 +620,10 @@ class CentralServer:
             if not self.files:
                 print("  (none)")
             else:
-                for filename, hosts in self.files.items():
-                    active_hosts = [h for h in hosts if h in self.clients and self.clients[h]['active']]
+                for filename, holders in self.files.items():
+                    active_hosts = [self.client_host[cid] for cid in holders if self.client_active[cid]]
                     print(f"  - {filename} (available on: {', '.join(active_hosts) if active_hosts else 'none'})")
             print()
-    
-    def get_timestamp(self):
-        """Get formatted timestamp"""
-        return datetime.now().strftime("%H:%M:%S")
 
 
 if __name__ == "__main__":